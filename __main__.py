@@ -6,17 +6,23 @@
 @Date-Time  : 2023/6/6 11:28
 """
 
+import argparse
 import atexit
 import logging
+import shutil
 import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from logging.config import dictConfig
 from pathlib import Path
 
-from settings import dsa_client, DSA_DEBUG, DSA_AUTH, DSA_HTTP, DSA_CONFIG
-from dsa_api import ActiveConfigNotFoundError
-from spider import create, load_text
+import log_queue
+import metrics
+from settings import (dsa_client, update_schedule, DSA_DEBUG, DSA_AUTH, DSA_HTTP, DSA_CONFIG, DSA_WORKER_CONCURRENCY,
+                      DSA_ENGINE, DSA_SCHEDULE, DSA_LOG_MODE, DSA_LOG_QUEUE, DSA_LOG_SAMPLE_EVERY, DSA_LOG_SAMPLE_BURST)
+from common import local_time
+from dsa_api import ActiveConfigNotFoundError, DSAClient
 
 logger = logging.getLogger('dsa.spider.__main__')
 
@@ -34,6 +40,14 @@ def filter_maker(level__lte, ex_names):
     return _filter
 
 
+def backends():
+    """领取到配置之后再导入抓取模块，没有工作时直接退出；selenium、feedparser、jieba 在第一次使用时导入"""
+    from spider import create, load_text
+    if DSA_ENGINE == 'async':
+        from async_engine import run_load_text as load_text
+    return create, load_text
+
+
 def init():
     """初始化"""
     config = dsa_client.active_config(force_config=DSA_CONFIG)
@@ -55,6 +69,7 @@ def init():
 def main():
     """main pages"""
     config = init()
+    create, load_text = backends()
     # 爬取主页页面
     # logger.info('===== Load Text ======')
     # load_text(config)
@@ -62,16 +77,116 @@ def main():
     create(config)
     logger.info('===== Load Text ======')
     load_text(config)
+    update_schedule.record(config['id'], dsa_client.Cache.COUNT_NEW_PAGE)
+
+
+def run_config(client: DSAClient, config):
+    """在 worker 模式中处理一个配置：心跳、日志记录、抓取列表与正文，并上传日志与状态
+
+    本配置的日志另外写入 logs/configs/<id>.log，上传的只有这个文件，见 log_queue.config_file；
+    上传的状态中只有本配置的指标，见 metrics.scope。
+    """
+    stop = threading.Event()
+
+    def heartbeats():
+        while not stop.wait(120):
+            client.heartbeat()
+
+    threading.Thread(target=heartbeats, daemon=True).start()
+    with log_queue.config_file(config['id'], Path('logs/configs', f'{config["id"]}.log')) as log_path, \
+            metrics.scope() as client.metrics:
+        try:
+            create, load_text = backends()
+            logger.info('===== [%s] Load List ======', config['name'])
+            create(config, client)
+            logger.info('===== [%s] Load Text ======', config['name'])
+            load_text(config, client)
+            client.Cache.EXIT_STATUS = 'Success'
+            update_schedule.record(config['id'], client.Cache.COUNT_NEW_PAGE)
+        except Exception as _e:
+            client.Cache.EXIT_STATUS = _e
+            logger.error('Has a Error in running %s, %s', config['name'], _e, exc_info=_e)
+        finally:
+            stop.set()
+            try:
+                client.upload_logs(log_path)
+            except Exception as _e:
+                logger.warning('Upload logs of %s error, %s', config['name'], _e)
+    client.upload_status(client.status_data())
+    with dsa_client.Cache.LOCK:  # 汇总到主客户端，用于退出时的统计
+        dsa_client.Cache.COUNT_NEW_PAGE += client.Cache.COUNT_NEW_PAGE
+        dsa_client.Cache.COUNT_UPDATE_TEXT += client.Cache.COUNT_UPDATE_TEXT
+        dsa_client.Cache.TEXT_SECONDS += client.Cache.TEXT_SECONDS
+
+
+def worker(concurrency, schedule=True, force_config=None):
+    """worker 模式：在一个进程内持续领取未锁定的配置并处理，至多同时处理 concurrency 个。
+
+    浏览器池、jieba 模型和 HTTP 连接池在全部配置之间共享，均在第一次使用时加载；没有更多工作时抛出 ActiveConfigNotFoundError。
+
+    :param schedule: 跳过按更新频率尚未到期的配置，见 scheduler.UpdateSchedule
+    :param force_config: 只处理指定的配置一次，不检查是否到期，同 DSA_CONFIG
+    """
+    print('worker', file=open('last_config_name', 'w', encoding='utf8'))
+    claimed, skipped = set(), 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='dsa-config') as pool:
+        running = set()
+        while True:
+            while len(running) < concurrency and not (force_config and claimed):
+                client = dsa_client.fork()
+                try:
+                    config = client.active_config(force_config=force_config)
+                except ActiveConfigNotFoundError:
+                    break
+                if config['id'] in claimed:  # 再次领取到已处理的配置，说明没有新的工作
+                    break
+                claimed.add(config['id'])
+                client.heartbeat()  # 立即标记为活跃，避免下一次领取到同一个配置
+                if schedule and not force_config and not update_schedule.due(config['id']):
+                    logger.info('Skip config %s, next run at %s.', config['name'],
+                                local_time(update_schedule.next_due(config['id'])))
+                    skipped += 1
+                    continue
+                client.log_start()
+                logger.info('Worker claimed config: %s', config['name'])
+                running.add(pool.submit(run_config, client, config))
+
+            if not running:
+                break
+            _, running = wait(running, return_when=FIRST_COMPLETED)
+
+    logger.info('Worker finished %d configs, %d not due.', len(claimed) - skipped, skipped)
+    raise ActiveConfigNotFoundError()
 
 
 if __name__ == "__main__":
     for i in Path(__file__).parent.joinpath('logs').iterdir():
-        i.unlink()
+        shutil.rmtree(i) if i.is_dir() else i.unlink()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', nargs='?', help='强制更新指定的配置，同 DSA_CONFIG')
+    parser.add_argument('--worker', action='store_true', help='持续领取并处理配置，直到没有更多工作')
+    parser.add_argument('--all', action='store_true', help='worker 模式下处理全部配置，不跳过未到期的配置')
+    parser.add_argument('--concurrency', type=int, default=DSA_WORKER_CONCURRENCY, help='worker 模式下同时处理的配置数')
+    parser.add_argument('--profile', action='store_true', help='对全部线程执行 cProfile，结果写入 logs/profile.pstats')
+    parser.add_argument('--metrics', choices=['json', 'prom'], help='退出时将运行指标写入 logs/metrics.json 或 logs/metrics.prom')
+    args = parser.parse_args()
+    DSA_CONFIG = args.config or DSA_CONFIG
+
+    profiler = metrics.ThreadProfiler() if args.profile else None
+    if profiler:
+        profiler.start()
 
     dictConfig(json.loads(open('logger_settings.json', 'r', encoding='utf8').read()))
+    if DSA_LOG_MODE == 'queue':  # 先于 dsa_client.at_exit 注册，退出时在日志上传之后停止
+        log_queue.install(DSA_LOG_QUEUE, lambda: log_queue.sampler(DSA_LOG_SAMPLE_EVERY, DSA_LOG_SAMPLE_BURST))
+        atexit.register(log_queue.stop)
     logger.info(f'Load Env Settings: \n{DSA_HTTP=} \n{DSA_AUTH=} \n{DSA_CONFIG=} \n{DSA_DEBUG=}')
     try:
-        main()
+        if args.worker:
+            worker(args.concurrency, schedule=DSA_SCHEDULE == 'adaptive' and not args.all, force_config=DSA_CONFIG)
+        else:
+            main()
         dsa_client.Cache.EXIT_STATUS = 'Success'
         _exit_code = 0
     except ActiveConfigNotFoundError:
@@ -85,9 +200,15 @@ if __name__ == "__main__":
         logger.info(
             'News Update: \n'
             'Created New Page: %d\n'
-            'Update Page\'s Text: %d',
+            'Update Page\'s Text: %d (%.2f pages/s)',
             dsa_client.Cache.COUNT_NEW_PAGE,
             dsa_client.Cache.COUNT_UPDATE_TEXT,
+            dsa_client.Cache.COUNT_UPDATE_TEXT / (dsa_client.Cache.TEXT_SECONDS or 1),
         )
+        # 写入 logs 的文件随日志一起上传
+        if args.metrics:
+            metrics.registry.dump(f'logs/metrics.{args.metrics}')
+        if profiler:
+            profiler.dump('logs/profile.pstats')
 
     exit(_exit_code)
@@ -0,0 +1,347 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+异步引擎：以 aiohttp 抓取正文并异步调用 Controller，单个进程可以保持数百个在途请求。
+
+本引擎只覆盖 load_text：AsyncFinds 提供与 Finds.get_text 相同的配置驱动接口；
+需要浏览器渲染的页面交给线程池中的 Selenium 处理(同步的 Finds)，static / js / auto 的判断与 Finds 相同。
+每个域名、Controller 与全部在途请求分别有并发上限。
+
+aiohttp 是可选依赖，DSA_ENGINE=async 时 load_text 使用本引擎；
+列表页的翻页依赖上一页的结果，create 仍使用线程模式。
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:  # 可选依赖
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import html_static
+import metrics
+from dsa_api import DSAClient
+from settings import (dsa_client, text_extractor, fetch_archive, DSA_ASYNC_CONCURRENCY, DSA_BROWSERS, DSA_HOST_CONCURRENCY, DSA_HOST_RPS,
+                      DSA_HTTP_POOL, DSA_PIPELINE_QUEUE, DSA_KEYWORD_BATCH)
+from spider import Finds, TextLoader
+from transport import IDEMPOTENT_METHODS, RETRY_STATUS, backoff, retry_after
+
+__all__ = ['AsyncEngine', 'AsyncFinds', 'AsyncController', 'AsyncHostLimiter', 'load_text', 'run_load_text']
+
+logger = logging.getLogger('dsa.spider.async')
+
+_TICK = object()  # 等待超时，发送不满的批次
+
+
+async def _batches(queue: asyncio.Queue, batch_size, max_wait) -> AsyncIterator[List[dict]]:
+    """从 queue 中读取，按数量或等待时间分批，直到读到 None，同 pipeline.batched"""
+    batch, done = [], False
+    while not done:
+        try:
+            body = await asyncio.wait_for(queue.get(), max_wait if batch else None)
+        except asyncio.TimeoutError:
+            body = _TICK
+        done = body is None
+        if isinstance(body, dict):
+            batch.append(body)
+        if batch and (done or body is _TICK or len(batch) >= batch_size):
+            yield batch
+            batch = []
+
+
+class AsyncHostLimiter:
+    """按域名的礼貌限制，同 scheduler.HostLimiter：每个域名至多 concurrency 个并发，每秒至多 rps 个请求"""
+
+    def __init__(self, concurrency=2, rps=1.0):
+        self.concurrency = concurrency
+        self.interval = 1 / rps if rps > 0 else 0
+        self._hosts = {}  # host -> [Semaphore, 下一个可用的时间点]
+
+    @asynccontextmanager
+    async def slot(self, url):
+        state = self._hosts.setdefault(urlsplit(url).netloc, [asyncio.Semaphore(self.concurrency), 0.0])
+        async with state[0]:
+            if self.interval:
+                now = time.monotonic()
+                at = max(now, state[1])
+                state[1] = at + self.interval
+                if at > now:
+                    await asyncio.sleep(at - now)
+            yield
+
+
+def _loads(data: bytes):
+    try:
+        return json.loads(data) if data else None
+    except ValueError:
+        return None
+
+
+class AsyncController:
+    """DSAClient 的异步版本，只包含 load_text 使用的接口
+
+    请求头、默认参数、重试次数、熔断器、计数与批量接口的支持状态都与 client 共享。
+
+    :param concurrency: 同时在途的 Controller 请求数
+    """
+
+    def __init__(self, client: DSAClient, session: 'aiohttp.ClientSession', concurrency=16):
+        self.client = client
+        self.session = session
+        self._sem = asyncio.Semaphore(concurrency)
+
+    async def request(self, method, url, params: dict = None, **kwargs) -> Tuple[int, object]:
+        """返回 (状态码, JSON)，重试与熔断同 DSAClient.request"""
+        client = self.client
+        params = {k: str(v) for k, v in dict(client.params, **(params or {})).items()}
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_status = RETRY_STATUS['idempotent' if idempotent else 'other']
+        endpoint = f'{method} {metrics.endpoint(url)}'
+
+        attempt = 0
+        while True:
+            client.breaker.allow()
+            try:
+                async with self._sem:
+                    with metrics.timer('controller_request', endpoint=endpoint):
+                        async with self.session.request(method, client.base_url + url, params=params,
+                                                        **kwargs) as resp:
+                            status, data, wait = resp.status, await resp.read(), retry_after(resp)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as _e:
+                client.breaker.record(False)
+                if attempt >= client.retries or not (idempotent or isinstance(_e, aiohttp.ClientConnectorError)):
+                    raise
+                wait = backoff(attempt)
+                logger.info('[%s] %s Error, %r, retry in %.1fs', method, url, _e, wait)
+            else:
+                client.breaker.record(status < 500)
+                if status not in retry_status or attempt >= client.retries:
+                    metrics.inc('controller_responses', status=status)
+                    return status, _loads(data)
+                wait = wait or backoff(attempt)
+                logger.info('[%s] %s HTTP_CODE(%d), retry in %.1fs', method, url, status, wait)
+            metrics.inc('controller_retries', endpoint=endpoint)
+            attempt += 1
+            await asyncio.sleep(wait)
+
+    async def page_no_text(self, config_id) -> List[dict]:
+        status, data = await self.request('GET', '/apis/pages/no_text/', params={'config_id': config_id})
+        if status != 200:
+            logger.error('Get /apis/pages/no_text/ Error HTTP_CODE(%d)', status)
+            return []
+        return (data.get('data') if isinstance(data, dict) else data) or []
+
+    async def _send(self, method, batch: List[dict]) -> Dict[str, bool]:
+        """发送一个批次，同 DSAClient._send_bulk"""
+        client = self.client
+        if client.bulk_supported:
+            status, data = await self.request(method, client.BULK_URL, **client.bulk_request(batch))
+            results = client.bulk_results(method, batch, status, data)
+            if results is not None:
+                return results
+
+        async def _single(body):
+            try:
+                status, data = await self.request(method, f'/apis/page/{body["page_id"]}/', json=body)
+                return status == 200 and isinstance(data, dict) and data.get('status') == 200
+            except Exception as _e:
+                logger.warning('%s page %s Error, %s', method, body['page_id'], _e)
+                return False
+
+        oks = await asyncio.gather(*(_single(body) for body in batch))
+        return {body['page_id']: ok for body, ok in zip(batch, oks)}
+
+    async def page_update_many(self, queue: asyncio.Queue, batch_size=20, max_wait=5.0, workers=4
+                               ) -> Dict[str, bool]:
+        """从 queue 中读取 body 并分批更新，直到读到 None；返回 {page_id: 是否成功}
+
+        同时在途的批次至多 workers 个，发送不及时 queue 会被填满，上游随之等待。
+        """
+        results, tasks = {}, []
+        sem = asyncio.Semaphore(workers)
+
+        async def _send(batch):
+            try:
+                result = await self._send('PUT', batch)
+            except Exception as _e:
+                logger.warning('Bulk PUT Error, %s', _e)
+                result = {body['page_id']: False for body in batch}
+            finally:
+                sem.release()
+            self.client.record_updates(result)
+            results.update(result)
+
+        async for batch in _batches(queue, batch_size, max_wait):
+            await sem.acquire()
+            tasks.append(asyncio.create_task(_send(batch)))
+        await asyncio.gather(*tasks)
+        logger.info('Page text is updated at Server, %d / %d', sum(results.values()), len(results))
+        return results
+
+
+class AsyncEngine:
+    """一次运行共享的资源：站点与 Controller 的 aiohttp 会话、按域名的限制、浏览器线程池
+
+        async with AsyncEngine(client) as engine:
+            finds = AsyncFinds(config, engine)
+            text = await finds.get_text(url)
+
+    :param concurrency: 站点请求的全局并发上限
+    :param browsers: 浏览器线程数，与浏览器池的大小一致
+    """
+
+    def __init__(self, client: DSAClient = None, concurrency=DSA_ASYNC_CONCURRENCY,
+                 host_concurrency=DSA_HOST_CONCURRENCY, host_rps=DSA_HOST_RPS,
+                 controller_concurrency=DSA_HTTP_POOL, browsers=DSA_BROWSERS, timeout=15):
+        if aiohttp is None:
+            raise RuntimeError('The async engine requires aiohttp, pip install aiohttp.')
+        self.client = client or dsa_client
+        self.concurrency = concurrency
+        self.controller_concurrency = controller_concurrency
+        self.timeout = timeout
+        self.limiter = AsyncHostLimiter(host_concurrency, host_rps)
+        self.browsers = ThreadPoolExecutor(max_workers=browsers, thread_name_prefix='dsa-browser')
+        self.session = None
+        self.controller: Optional[AsyncController] = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            headers={'User-Agent': html_static.UA},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+        )
+        timeout = self.client.timeout
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        controller_session = aiohttp.ClientSession(
+            headers=dict(self.client.headers),
+            timeout=aiohttp.ClientTimeout(connect=connect, sock_read=read),
+            connector=aiohttp.TCPConnector(limit=self.controller_concurrency),
+        )
+        self.controller = AsyncController(self.client, controller_session, self.controller_concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        await self.controller.session.close()
+        self.browsers.shutdown(wait=True)
+
+    async def fetch(self, url) -> Tuple[bytes, Optional[str], str, str]:
+        """遵守域名限制获取页面，非 2xx 抛出异常；返回 (content, charset, 最终 URL, Content-Type)
+
+        录制时保存响应；回放时从存档读取，没有录制时抛出 NotRecorded
+        """
+        if fetch_archive is not None and fetch_archive.replaying:
+            record = await asyncio.to_thread(fetch_archive.resolve, url)
+            return record.content, record.charset, record.final_url, record.content_type
+        async with self.limiter.slot(url):
+            _start = time.perf_counter()
+            async with self.session.get(url) as resp:
+                resp.raise_for_status()
+                content = await resp.read()
+            metrics.observe('site_request_seconds', time.perf_counter() - _start, host=metrics.host(url))
+        content_type = resp.headers.get('Content-Type', '')
+        if fetch_archive is not None:
+            await asyncio.to_thread(fetch_archive.put, url, content, final_url=str(resp.url), content_type=content_type)
+        return content, resp.charset, str(resp.url), content_type
+
+    async def in_browser(self, func: Callable, url):
+        """在浏览器线程池中执行 func(url)，同样遵守域名限制"""
+        async with self.limiter.slot(url):
+            # run_in_executor 不传递 contextvars，日志需要计入当前配置(见 log_queue.config_file)
+            return await asyncio.get_running_loop().run_in_executor(self.browsers, contextvars.copy_context().run,
+                                                                    func, url)
+
+
+class AsyncFinds:
+    """Finds 的异步版本：get_text(url) 返回正文"""
+
+    def __init__(self, config, engine: AsyncEngine):
+        self.config = config
+        self.engine = engine
+        self.finds = Finds(config)  # 选择器、static / js 的判断与浏览器操作
+
+    async def get_text(self, url) -> str:
+        """同 Finds.get_text"""
+        if not self.finds.text_selectors_valid:
+            return ''
+        selectors = self.finds.selector_page_text
+        with metrics.timer('finds_get_text', host=metrics.host(url)):
+            text = await asyncio.to_thread(text_extractor.reextract, url, selectors)
+            if text:
+                return text
+            if self.finds.use_static:
+                try:
+                    content, charset, _, _ = await self.engine.fetch(url)
+                    markup = content.decode(charset, errors='replace') if charset else content
+                    text = await asyncio.to_thread(text_extractor.extract, url, markup, selectors)
+                except Exception as _e:  # 网络错误、解析错误、选择器语法错误均回退到浏览器
+                    logger.info('Static fetch %s error, %r', url, _e)
+                    text = ''
+                self.finds.count_static(url, text)
+                if text:
+                    return text
+            return await self.engine.in_browser(self.finds.browser_text, url)
+
+
+async def load_text(config, client: DSAClient = None):
+    """spider.load_text 的异步版本：并发抓取全部没有正文的 page，关键词在线程中按批次提取，分批上传"""
+    client = client or dsa_client
+    loader = TextLoader(config, client)
+    _start = time.monotonic()
+
+    async with AsyncEngine(client) as engine:
+        finds = AsyncFinds(config, engine)
+        queue, prepared = asyncio.Queue(DSA_PIPELINE_QUEUE), asyncio.Queue(DSA_PIPELINE_QUEUE)
+        uploader = asyncio.create_task(engine.controller.page_update_many(queue))
+
+        async def _keywords():
+            """从 prepared 中分批提取关键词，交给上传队列"""
+            try:
+                async for batch in _batches(prepared, DSA_KEYWORD_BATCH, 2.0):
+                    for body in await asyncio.to_thread(loader.complete, batch):
+                        await queue.put(body)
+            finally:
+                await queue.put(None)
+
+        keywords = asyncio.create_task(_keywords())
+
+        async def _load(item: dict):
+            """单个 page 的错误只记录日志，不影响其它 page 与上传，同线程模式的 load_text"""
+            try:
+                body = loader.resumed(item)
+                if body is None:
+                    try:
+                        text = await finds.get_text(item['link'])
+                    except Exception as _e:
+                        loader.failed(item, _e)
+                        raise
+                    body = await asyncio.to_thread(loader.prepare, item, text)  # 指纹是 CPU 密集的
+            except Exception as _e:
+                logger.error('Load text error, link: %s, %s', item['link'], _e, exc_info=_e)
+                return
+            if body is not None:
+                await prepared.put(body)
+
+        try:
+            items = list(loader.items(await engine.controller.page_no_text(config['id'])))
+            logger.info('Load text of %d pages.', len(items))
+            await asyncio.gather(*(_load(item) for item in items))
+        finally:
+            await prepared.put(None)  # 出错时也结束关键词与上传任务
+        await keywords
+        results = await uploader
+
+    client.Cache.TEXT_SECONDS += time.monotonic() - _start
+    loader.finish(results)
+
+
+def run_load_text(config, client: DSAClient = None):
+    """在新的事件循环中运行 load_text，可以在 worker 模式的线程中调用"""
+    asyncio.run(load_text(config, client))
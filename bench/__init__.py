@@ -0,0 +1 @@
+"""离线基准测试：模拟 Controller、本地静态站点与测试场景"""
@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟的 DSA Controller，实现 DSAClient 使用到的 /apis/... 接口，数据保存在内存中。
+可配置每个请求的延迟和错误率(返回 500)，用于基准测试。
+"""
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+__all__ = ['MockController']
+
+
+class MockController(ThreadingHTTPServer):
+    """模拟 Controller
+
+    :param configs: 可领取的配置列表，每个配置需要 id 与 name
+    :param latency: 每个请求的额外延迟(秒)
+    :param error_rate: 随机返回 500 的比例
+    :param bulk: 是否支持 /apis/pages/bulk/
+    """
+    daemon_threads = True
+
+    def __init__(self, configs, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, bulk=True):
+        super().__init__((host, port), _Handler)
+        self.configs = {c['name']: c for c in configs}
+        self.unclaimed = list(configs)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bulk = bulk
+        self.pages = {}  # page_id -> page
+        self.logs = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockController
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: dict, code=200):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return json.loads(data or b'null')
+
+    def _dispatch(self, method):
+        srv = self.server
+        if srv.latency:
+            time.sleep(srv.latency)
+        if srv.error_rate and random.random() < srv.error_rate:
+            self._body() if method in ('POST', 'PUT') else None
+            return self._reply({'status': 500, 'message': 'mock error'}, 500)
+
+        url = urlsplit(self.path)
+        path, query = url.path, {k: v[0] for k, v in parse_qs(url.query).items()}
+        for pattern, handler in _ROUTES:
+            m = re.fullmatch(pattern[1], path)
+            if pattern[0] == method and m:
+                return handler(self, query, *m.groups())
+        if method in ('POST', 'PUT'):
+            self._body()
+        self._reply({'status': 404, 'message': f'{method} {path} not found'}, 404)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    # ----- handlers -----
+    def config_unlocked(self, query):
+        with self.server.lock:
+            if not self.server.unclaimed:
+                return self._reply({'status': 406, 'message': 'no config'}, 406)
+            return self._reply({'status': 200, 'data': self.server.unclaimed.pop(0)})
+
+    def config_get(self, query, name):
+        if name not in self.server.configs:
+            return self._reply({'status': 406, 'message': 'no config'}, 406)
+        return self._reply({'status': 200, 'data': self.server.configs[name]})
+
+    def heartbeat(self, query):
+        self._reply({'status': 200})
+
+    def _config_pages(self, query):
+        config_id = query.get('config_id')
+        since = query.get('since')
+        with self.server.lock:
+            return [p for p in self.server.pages.values()
+                    if str(p['config_id']) == str(config_id) and (not since or p['created'] >= since)]
+
+    def pages_id(self, query):
+        self._reply({'status': 200, 'data': [p['page_id'] for p in self._config_pages(query)]})
+
+    def pages_link(self, query):
+        self._reply({'status': 200, 'data': [p['link'] for p in self._config_pages(query)]})
+
+    def pages_all(self, query):
+        self._reply({'status': 200, 'data': self._config_pages(query)})
+
+    def pages_no_text(self, query):
+        self._reply({'status': 200, 'data': [{'page_id': p['page_id'], 'link': p['link']}
+                                             for p in self._config_pages(query) if not p.get('text')]})
+
+    def _create(self, body, config_id):
+        with self.server.lock:
+            if body['page_id'] in self.server.pages:
+                return False
+            self.server.pages[body['page_id']] = dict(body, config_id=config_id,
+                                                      created=time.strftime('%Y-%m-%d %H:%M:%S %z'))
+            return True
+
+    def _update(self, body):
+        with self.server.lock:
+            if body['page_id'] not in self.server.pages:
+                return False
+            self.server.pages[body['page_id']].update(body)
+            return True
+
+    def page_create(self, query, page_id):
+        ok = self._create(self._body(), query.get('config_id'))
+        self._reply({'status': 200} if ok else {'status': 400, 'message': 'exists'})
+
+    def page_update(self, query, page_id):
+        ok = self._update(self._body())
+        self._reply({'status': 200} if ok else {'status': 404, 'message': 'not found'})
+
+    def _bulk(self, query, func):
+        if not self.server.bulk:
+            self._body()
+            return self._reply({'status': 404, 'message': 'not found'}, 404)
+        data = [{'page_id': b['page_id'], 'status': 200 if func(b) else 400} for b in self._body()['pages']]
+        self._reply({'status': 200, 'data': data})
+
+    def bulk_create(self, query):
+        self._bulk(query, lambda b: self._create(b, query.get('config_id')))
+
+    def bulk_update(self, query):
+        self._bulk(query, self._update)
+
+    def log_create(self, query):
+        with self.server.lock:
+            log_id = len(self.server.logs) + 1
+            self.server.logs[log_id] = self._body()
+        self._reply({'status': 200, 'id': log_id})
+
+    def log_upload(self, query, log_id):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._reply({'status': 200})
+
+    def log_update(self, query, log_id):
+        with self.server.lock:
+            self.server.logs.setdefault(int(log_id), {}).update(self._body())
+        self._reply({'status': 200})
+
+
+_ROUTES = [
+    (('GET', r'/apis/config/unlocked'), _Handler.config_unlocked),
+    (('GET', r'/apis/config/heartbeat'), _Handler.heartbeat),
+    (('GET', r'/apis/config/([^/]+)/'), _Handler.config_get),
+    (('GET', r'/apis/pages/id'), _Handler.pages_id),
+    (('GET', r'/apis/pages/link'), _Handler.pages_link),
+    (('GET', r'/apis/pages'), _Handler.pages_all),
+    (('GET', r'/apis/pages/no_text/'), _Handler.pages_no_text),
+    (('POST', r'/apis/page/([^/]+)/'), _Handler.page_create),
+    (('PUT', r'/apis/page/([^/]+)/'), _Handler.page_update),
+    (('POST', r'/apis/pages/bulk/'), _Handler.bulk_create),
+    (('PUT', r'/apis/pages/bulk/'), _Handler.bulk_update),
+    (('POST', r'/apis/log/create'), _Handler.log_create),
+    (('POST', r'/apis/log/(\d+)/upload'), _Handler.log_upload),
+    (('PUT', r'/apis/log/(\d+)'), _Handler.log_update),
+]
@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+端到端基准测试：启动本地模拟 Controller 与静态站点，对每个场景运行 create 与 load_text，
+报告每秒处理的页数、各阶段请求延迟的 p50/p99 以及进程内存峰值。完全离线，可在 CI 中运行。
+
+    python -m bench.run --articles 400 --latency 0.005 --report bench_report.json
+    python -m bench.run --baseline bench_baseline.json  # 吞吐量低于基线超过 --tolerance 时退出码为 1
+    python -m bench.run --replay record && python -m bench.run --replay replay  # 录制后不启动站点，从存档回放
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.mock_controller import MockController  # noqa: E402
+from bench.site_server import SiteServer, CONFIG_HTML, CONFIG_RSS  # noqa: E402
+from metrics import peak_rss_mb  # noqa: E402
+
+
+class Recorder:
+    """按阶段记录请求耗时"""
+
+    def __init__(self, controller_url):
+        self.controller_url = controller_url
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def phase(self, request) -> str:
+        path = urlsplit(request.url).path
+        if request.url.startswith(self.controller_url):
+            return f'controller {request.method} ' + re.sub(r'/[0-9a-f]{32}/|/\d+(/|$)', r'/{id}\1', path)
+        if path.startswith('/article/'):
+            return 'site article'
+        return 'site feed' if path.endswith('.xml') else 'site list'
+
+    def hook(self, resp, *args, **kwargs):
+        with self._lock:
+            self.samples[self.phase(resp.request)].append(resp.elapsed.total_seconds())
+
+    def summary(self) -> dict:
+        result = {}
+        for phase, values in sorted(self.samples.items()):
+            quantiles = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+            result[phase] = {'count': len(values),
+                             'p50_ms': round(quantiles[49] * 1000, 2),
+                             'p99_ms': round(quantiles[98] * 1000, 2)}
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dsa-spider offline benchmark')
+    parser.add_argument('--articles', type=int, default=200, help='站点的文章数')
+    parser.add_argument('--per-page', type=int, default=20, help='列表每页的文章数')
+    parser.add_argument('--article-size', type=int, default=2000, help='文章的大约字数')
+    parser.add_argument('--site-latency', type=float, default=0.0, help='站点每个请求的延迟(秒)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Controller 每个请求的延迟(秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Controller 返回 500 的比例')
+    parser.add_argument('--no-bulk', action='store_true', help='Controller 不支持批量接口')
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread', help='load_text 使用的引擎')
+    parser.add_argument('--replay', choices=['record', 'replay'], help='录制站点响应，或不启动站点、只从存档回放')
+    parser.add_argument('--replay-dir', default='bench_replay', help='录制的存档目录')
+    parser.add_argument('--site-port', type=int, default=18765, help='--replay 时站点的固定端口，存档以 URL 为键')
+    parser.add_argument('--report', help='将结果写入 JSON 文件')
+    parser.add_argument('--baseline', help='与基线 JSON 比较吞吐量')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许低于基线的比例')
+    args = parser.parse_args()
+
+    site = SiteServer(port=args.site_port if args.replay else 0, articles=args.articles, per_page=args.per_page,
+                      article_size=args.article_size, latency=args.site_latency)
+    if args.replay == 'replay':
+        site.server_close()  # 只需要站点的地址
+    else:
+        site.start()
+    max_pages = args.articles // args.per_page + 1
+    configs = [site.config(dict(CONFIG_HTML, max_pages=max_pages)), site.config(CONFIG_RSS)]
+    controller = MockController(configs, latency=args.latency, error_rate=args.error_rate,
+                                bulk=not args.no_bulk).start()
+
+    # settings 在导入时读取环境变量
+    os.environ.update(DSA_HTTP=controller.url, DSA_AUTH='', DSA_CACHE_DIR=tempfile.mkdtemp(prefix='dsa-bench-'),
+                      DSA_HOST_RPS='0', DSA_HOST_CONCURRENCY='8')
+    if args.replay:
+        os.environ.update(DSA_REPLAY=args.replay, DSA_REPLAY_DIR=str(Path(args.replay_dir).resolve()))
+    os.environ.pop('IN_DSA_HTTP', None)
+    os.environ.pop('ENV_DSA_HTTP', None)
+    Path('logs').mkdir(exist_ok=True)
+
+    import html_static
+    import spider
+    from settings import dsa_client
+    if args.engine == 'async':
+        from async_engine import run_load_text as load_text
+    else:
+        load_text = spider.load_text
+
+    recorder = Recorder(controller.url)
+    html_static.session.hooks['response'].append(recorder.hook)
+
+    report = {'args': vars(args), 'scenarios': {}}
+    for config in configs:
+        client = dsa_client.fork()
+        client.hooks['response'].append(recorder.hook)
+        client.active_config(force_config=config['name'])
+
+        _start = time.monotonic()
+        spider.create(config, client)
+        create_seconds = time.monotonic() - _start
+
+        _start = time.monotonic()
+        load_text(config, client)
+        text_seconds = time.monotonic() - _start
+
+        report['scenarios'][config['name']] = {
+            'create': {'pages': client.Cache.COUNT_NEW_PAGE, 'seconds': round(create_seconds, 3),
+                       'pages_per_sec': round(client.Cache.COUNT_NEW_PAGE / (create_seconds or 1), 2)},
+            'load_text': {'pages': client.Cache.COUNT_UPDATE_TEXT, 'seconds': round(text_seconds, 3),
+                          'pages_per_sec': round(client.Cache.COUNT_UPDATE_TEXT / (text_seconds or 1), 2)},
+        }
+    report['latency'] = recorder.summary()
+    report['peak_rss_mb'] = round(peak_rss_mb(), 1)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf8')
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf8'))
+        regressions = [
+            f'{name}.{phase}: {result[phase]["pages_per_sec"]} < {baseline_phase["pages_per_sec"]}'
+            for name, result in report['scenarios'].items()
+            for phase, baseline_phase in baseline.get('scenarios', {}).get(name, {}).items()
+            if result[phase]['pages_per_sec'] < baseline_phase['pages_per_sec'] * (1 - args.tolerance)
+        ]
+        if regressions:
+            print('Performance regressions:\n  ' + '\n  '.join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+本地静态站点，用于基准测试：分页的新闻列表、文章页和 RSS。
+
+    /news?page=N     第 N 页列表，每页 per_page 篇文章，带有下一页链接
+    /article/N       第 N 篇文章
+    /feed.xml        全部文章的 RSS
+"""
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+__all__ = ['SiteServer', 'CONFIG_HTML', 'CONFIG_RSS']
+
+# 与站点结构对应的配置，link 中的 {url} 在运行时替换为站点地址
+CONFIG_HTML = {
+    'id': 1,
+    'name': 'bench-html',
+    'type': 'html-static',
+    'link': '{url}/news?page=1',
+    'selector_list': 'ul.news > li > a',
+    'selector_next': 'a.next',
+    'selector_page': 'div.article',
+}
+CONFIG_RSS = {
+    'id': 2,
+    'name': 'bench-rss',
+    'type': 'rss',
+    'link': '{url}/feed.xml',
+    'selector_page': 'div.article',
+}
+
+_WORDS = ('数据 保护 个人 信息 监管 机构 发布 通知 平台 透明 程序 公开 登记 处罚 合规 '
+          'data protection authority notice registry public transparency procedure fine compliance').split()
+
+
+class SiteServer(ThreadingHTTPServer):
+    """
+    :param articles: 文章总数
+    :param per_page: 每页文章数
+    :param article_size: 每篇文章的大约字数
+    :param latency: 每个请求的额外延迟(秒)
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, articles=200, per_page=20, article_size=2000, latency=0.0):
+        super().__init__((host, port), _Handler)
+        self.articles = articles
+        self.per_page = per_page
+        self.latency = latency
+        rand = random.Random(42)
+        self.texts = [' '.join(rand.choice(_WORDS) for _ in range(article_size // 3)) for _ in range(articles)]
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def config(self, template: dict) -> dict:
+        return dict(template, link=template['link'].format(url=self.url))
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: SiteServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: str, content_type='text/html; charset=utf-8', code=200):
+        data = body.encode()
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        srv = self.server
+        if srv.latency:
+            time.sleep(srv.latency)
+        url = urlsplit(self.path)
+        if url.path == '/news':
+            return self._reply(self._list(int(parse_qs(url.query).get('page', ['1'])[0])))
+        if url.path.startswith('/article/'):
+            return self._reply(self._article(int(url.path.rsplit('/', 1)[-1])))
+        if url.path == '/feed.xml':
+            return self._reply(self._feed(), 'application/rss+xml; charset=utf-8')
+        self._reply('<html><body>Not Found</body></html>', code=404)
+
+    def _list(self, page):
+        srv = self.server
+        start = (page - 1) * srv.per_page
+        items = ''.join(f'<li><a href="/article/{n}">Article {n}</a></li>'
+                        for n in range(start, min(start + srv.per_page, srv.articles)))
+        _next = f'<a class="next" href="/news?page={page + 1}">next</a>' if start + srv.per_page < srv.articles else ''
+        return (f'<!DOCTYPE html><html><head><title>News {page}</title><script>var x = 1;</script></head>'
+                f'<body><nav>Home | News</nav><ul class="news">{items}</ul>{_next}<footer>footer</footer></body></html>')
+
+    def _article(self, n):
+        if not 0 <= n < self.server.articles:
+            return '<html><body>Not Found</body></html>'
+        return (f'<!DOCTYPE html><html><head><title>Article {n}</title></head><body><nav>Home | News</nav>'
+                f'<div class="article"><h1>Article {n}</h1><p>{self.server.texts[n]}</p></div>'
+                f'<footer>footer</footer></body></html>')
+
+    def _feed(self):
+        items = ''.join(f'<item><title>Article {n}</title><link>{self.server.url}/article/{n}</link>'
+                        f'<description>Article {n}</description></item>' for n in range(self.server.articles))
+        return f'<?xml version="1.0"?><rss version="2.0"><channel><title>bench</title>{items}</channel></rss>'
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准：对没有可领取配置的模拟 Controller 运行 `__main__.py --worker`，测量直到以 119 退出的耗时，
+并通过 -X importtime 统计每个顶层包的导入耗时。down.yml 每天多次启动进程，冷启动耗时直接影响总耗时。
+
+没有工作的运行不应导入 selenium、jieba、feedparser、aiohttp；导入了这些包，
+或耗时的中位数比基线慢超过 --tolerance 时退出码为 1。与正常运行相同，会清空 logs 目录。
+
+    python -m bench.startup --runs 5 --report startup_report.json
+    python -m bench.startup --baseline startup_baseline.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.mock_controller import MockController  # noqa: E402
+
+# 只在使用时导入的包
+LAZY_PACKAGES = ('selenium', 'jieba', 'feedparser', 'aiohttp')
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+\d+ \| +(\S+)$')
+
+
+def run_once(env) -> dict:
+    """运行一次，返回耗时(秒)、退出码与每个顶层包的导入耗时(毫秒，各模块自身耗时之和)"""
+    _start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '__main__.py', '--worker'], cwd=ROOT, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - _start
+    imports = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        m = _IMPORT_TIME.match(line)
+        if m:
+            imports[m.group(2).split('.')[0]] += int(m.group(1)) / 1000
+    return {'seconds': seconds, 'exit_code': proc.returncode, 'imports': imports}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dsa-spider startup benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='运行次数，报告中位数与最小值')
+    parser.add_argument('--report', help='将结果写入 JSON 文件')
+    parser.add_argument('--baseline', help='与基线 JSON 比较耗时的中位数')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许超过基线的比例')
+    args = parser.parse_args()
+
+    controller = MockController([]).start()
+    env = dict(os.environ, DSA_HTTP=controller.url, DSA_AUTH='', DSA_CACHE_DIR=tempfile.mkdtemp(prefix='dsa-startup-'))
+    for key in ('IN_DSA_HTTP', 'ENV_DSA_HTTP', 'DSA_CONFIG'):
+        env.pop(key, None)
+    ROOT.joinpath('logs').mkdir(exist_ok=True)
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    seconds = [r['seconds'] for r in runs]
+    imports = runs[-1]['imports']
+    report = {
+        'args': vars(args),
+        'exit_codes': sorted({r['exit_code'] for r in runs}),
+        'median_seconds': round(statistics.median(seconds), 3),
+        'min_seconds': round(min(seconds), 3),
+        'import_ms': {name: round(ms, 1) for name, ms in sorted(imports.items(), key=lambda i: -i[1])[:15]},
+        'lazy_imported': [name for name in LAZY_PACKAGES if name in imports],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf8')
+
+    errors = []
+    if report['exit_codes'] != [119]:
+        errors.append(f'exit codes {report["exit_codes"]} != [119]')
+    if report['lazy_imported']:
+        errors.append(f'imported at startup: {", ".join(report["lazy_imported"])}')
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf8'))
+        if report['median_seconds'] > baseline['median_seconds'] * (1 + args.tolerance):
+            errors.append(f'median_seconds: {report["median_seconds"]} > {baseline["median_seconds"]}')
+    if errors:
+        print('Startup regressions:\n  ' + '\n  '.join(errors), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+文字统计的微基准：比较 lang 模块与原来逐字符循环的 has_chinese、正则 search，
+正文大小取 2KB / 20KB / 300KB(较长的法规文件)，另有 1000 个标题的批量分类。
+
+    python -m bench.text_lang --report text_lang_report.json
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import lang  # noqa: E402
+
+_ZH = '个人信息 保护 监管 机构 发布 通知 平台 应当 公开 透明 程序 登记 处罚 合规 数据 出境 安全 评估'.split()
+_EN = ('data protection authority published notice registry public transparency procedure fine '
+       'compliance controller processor transfer assessment').split()
+_CJK = re.compile('[一-龥]')
+
+
+def _has_chinese_loop(s: str, threshold=1) -> bool:
+    """原来的 spider.has_chinese"""
+    _ec = 0
+    for _c in s:
+        if '一' <= _c <= '龥':
+            if _ec < threshold - 1:
+                _ec += 1
+            else:
+                return True
+    return False
+
+
+def _text(kind, size, rand) -> str:
+    """约 size 个字符的正文：zh 中文，en 英文，mixed 英文为主、结尾引用少量中文"""
+    words, sep = (_ZH, '') if kind == 'zh' else (_EN, ' ')
+    text = sep.join(rand.choice(words) for _ in range(size // (3 if kind == 'zh' else 8)))
+    return text[:size - 20] + '(原文：数据保护监管机构)' if kind == 'mixed' else text[:size]
+
+
+def _us(func, *args) -> float:
+    """单次调用的微秒数，取 5 轮中最快的一轮"""
+    timer = timeit.Timer(lambda: func(*args))
+    number, _ = timer.autorange()
+    return round(min(timer.repeat(5, number)) / number * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dsa-spider text script detection microbenchmark')
+    parser.add_argument('--report', help='将结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    rand = random.Random(42)
+    report = {'pages': {}, 'batch': {}}
+    for kind in ('zh', 'en', 'mixed'):
+        for size in (2_000, 20_000, 300_000):
+            text = _text(kind, size, rand)
+            # 关键词路由需要整篇的统计，循环以 threshold = len(text) 模拟整篇扫描
+            loop, loop_full = _us(_has_chinese_loop, text), _us(_has_chinese_loop, text, len(text) + 1)
+            stats = _us(lang.script_stats, text)
+            report['pages'][f'{kind}-{size // 1000}k'] = {
+                'has_chinese_loop_us': loop,
+                'loop_full_scan_us': loop_full,
+                'regex_search_us': _us(_CJK.search, text),
+                'lang_has_chinese_us': _us(lang.has_chinese, text),
+                'script_stats_us': stats,
+                'speedup_vs_full_scan': round(loop_full / stats, 1),
+                'lang': lang.detect_lang(text),
+            }
+
+    titles = [_text(rand.choice(('zh', 'en')), rand.randint(10, 80), rand) for _ in range(1000)]
+    loop, single, batch = (_us(lambda: [_has_chinese_loop(t) for t in titles]),
+                           _us(lambda: [lang.detect_lang(t) for t in titles]),
+                           _us(lang.classify, titles))
+    report['batch']['titles-1000'] = {'has_chinese_loop_us': loop, 'detect_lang_each_us': single,
+                                      'classify_us': batch, 'speedup_vs_loop': round(loop / batch, 1)}
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,10 +5,35 @@
 @Author     : LeeCQ
 @Date-Time  : 2023/5/11 14:55
 """
+import atexit
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
 from selenium.webdriver import Chrome, ChromeOptions
 from selenium.webdriver.chrome.service import Service
 
-__all__ = ['chrome']
+import metrics
+
+try:  # 可选依赖，用于统计浏览器进程内存
+    import psutil
+except ImportError:
+    psutil = None
+
+__all__ = ['chrome', 'BrowserPool', 'get_pool', 'BLOCKED_URLS']
+
+logger = logging.getLogger('dsa.spider.chrome')
+
+# 性能模式下通过 DevTools 屏蔽的请求：字体、音视频、统计与广告
+BLOCKED_URLS = [
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.m3u8', '*.mp3', '*.ogg', '*.wav',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*googleadservices.com*', '*connect.facebook.net*', '*hotjar.com*', '*matomo*', '*piwik*',
+    '*hm.baidu.com*', '*cnzz.com*', '*51.la*',
+]
 
 
 def chrome(executable_path='chromedriver',
@@ -21,10 +46,19 @@ def chrome(executable_path='chromedriver',
            display_notifications: bool = True,
            notification=None,
            use_gpu=True,
+           performance: bool = False,
+           page_load_strategy: str = None,
+           block_urls: list = None,
+           disk_cache_dir: str = None,
            **kwargs
            ):
     """参数说明：
 
+    :param performance: 性能模式，page_load_strategy 默认 eager，block_urls 默认 BLOCKED_URLS
+    :param page_load_strategy: 页面加载策略 normal / eager / none
+    :param block_urls: 通过 DevTools 屏蔽的 URL 模式，支持通配符 *
+    :param disk_cache_dir: 磁盘缓存目录，浏览器回收重建后仍可复用
+
     :param ua:
     :param js:
     :param maximized: 窗口最大化
@@ -48,6 +82,9 @@ def chrome(executable_path='chromedriver',
     use_js = use_js if js is None else js
     display_pic = display_pic if pic is None else pic
     display_notifications = display_notifications if notification else notification
+    if performance:
+        page_load_strategy = page_load_strategy or 'eager'
+        block_urls = BLOCKED_URLS if block_urls is None else block_urls
 
     __opt = _option(headless=is_headless,
                     maximized=is_maximized,
@@ -56,6 +93,8 @@ def chrome(executable_path='chromedriver',
                     pic=display_pic,
                     notifications=display_notifications,
                     use_gpu=use_gpu,
+                    page_load_strategy=page_load_strategy,
+                    disk_cache_dir=disk_cache_dir,
                     **kwargs
                     )
 
@@ -65,10 +104,14 @@ def chrome(executable_path='chromedriver',
     browser = Chrome(service=__service,
                      options=__opt,
                      )
+    if block_urls:
+        browser.execute_cdp_cmd('Network.enable', {})
+        browser.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(block_urls)})
     return browser
 
 
-def _option(headless, maximized, incognito, js, ua, pic, notifications, use_gpu, **kwargs):
+def _option(headless, maximized, incognito, js, ua, pic, notifications, use_gpu,
+            page_load_strategy=None, disk_cache_dir=None, **kwargs):
     option = ChromeOptions()
     # 设置
     _pre = dict()
@@ -83,6 +126,10 @@ def _option(headless, maximized, incognito, js, ua, pic, notifications, use_gpu,
         option.add_argument('–-incognito')  # 基本没什么用
     if ua:
         option.add_argument(f'user-agent={ua}')  # 设置UA
+    if page_load_strategy:
+        option.page_load_strategy = page_load_strategy  # 页面加载策略
+    if disk_cache_dir:
+        option.add_argument(f'--disk-cache-dir={disk_cache_dir}')  # 磁盘缓存
     if js is False:
         _pre.update({'javascript': 2})  # 设置JS
     if pic is False:
@@ -98,4 +145,165 @@ def _option(headless, maximized, incognito, js, ua, pic, notifications, use_gpu,
             option.add_argument(_ if isinstance(_, str) else '')
 
     option.add_experimental_option('prefs', {'profile.default_content_setting_values': _pre})
-    return option
\ No newline at end of file
+    return option
+
+
+class BrowserPool:
+    """Chrome 浏览器池
+
+    保持至多 size 个常驻的浏览器，借出前检查健康状态；
+    一个浏览器被借出 max_pages 次（每次借出计为一页）或内存超过 max_rss_mb 后将被回收重建；
+    进程退出时关闭全部浏览器。
+
+    指定 cache_dir 时每个位置(slot)使用 cache_dir 下固定的磁盘缓存目录，
+    同一时刻一个缓存目录只被一个浏览器使用，回收重建后的浏览器沿用原来的缓存。
+    """
+
+    def __init__(self, size=2, max_pages=50, max_rss_mb=1024, cache_dir=None, **chrome_kwargs):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.cache_dir = cache_dir
+        self.chrome_kwargs = chrome_kwargs
+        self._free_slots = list(range(size))
+        self._slot_of = {}  # browser -> slot
+
+        self._idle = queue.LifoQueue()  # 空闲浏览器，后进先出，优先复用热的浏览器
+        self._slots = threading.BoundedSemaphore(size)
+        self._pages = {}  # browser -> 已加载的页数
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def borrow(self, timeout=None):
+        """借出一个浏览器，with 结束时归还"""
+        if self._closed:
+            raise RuntimeError('BrowserPool is closed.')
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f'No idle browser in {timeout}s.')
+
+        browser = None
+        try:
+            browser = self._take()
+            yield browser
+        except Exception:
+            self._discard(browser)  # 浏览器可能已崩溃或卡死(chromedriver 无响应时抛出 urllib3 的异常)，不再归还
+            browser = None
+            raise
+        finally:
+            if browser is not None:
+                self._give_back(browser)
+            self._slots.release()
+
+    def _take(self):
+        """取出一个健康的浏览器，没有则新建"""
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._healthy(browser):
+                return browser
+            self._discard(browser)
+
+        with self._lock:
+            slot = self._free_slots.pop()
+        kwargs = dict(self.chrome_kwargs)
+        if self.cache_dir:
+            kwargs['disk_cache_dir'] = str(Path(self.cache_dir).joinpath(f'slot-{slot}'))
+        try:
+            with metrics.timer('browser_launch'):
+                browser = chrome(**kwargs)
+        except Exception:
+            with self._lock:
+                self._free_slots.append(slot)
+            raise
+        with self._lock:
+            self._pages[browser] = 0
+            self._slot_of[browser] = slot
+            metrics.gauge('browsers', len(self._pages))
+        metrics.inc('browser_launches')
+        logger.info('Launch a new browser, total: %d', len(self._pages))
+        return browser
+
+    def _give_back(self, browser):
+        """归还浏览器，达到回收条件时关闭它"""
+        with self._lock:
+            self._pages[browser] = self._pages.get(browser, 0) + 1
+            pages = self._pages[browser]
+
+        rss = self.rss(browser)
+        metrics.gauge('browser_rss_mb', rss / 1024 / 1024)
+        if self._closed:
+            self._discard(browser)
+        elif pages >= self.max_pages:
+            logger.info('Recycle a browser after %d pages.', pages)
+            self._discard(browser)
+        elif rss > self.max_rss:
+            logger.info('Recycle a browser, RSS is over %d MB.', self.max_rss // 1024 // 1024)
+            self._discard(browser)
+        else:
+            self._idle.put(browser)
+
+    @staticmethod
+    def _healthy(browser) -> bool:
+        """浏览器是否仍然可用"""
+        try:
+            browser.current_url
+            return True
+        except Exception:  # WebDriverException，或 chromedriver 无响应时 urllib3 的 MaxRetryError / ReadTimeoutError
+            return False
+
+    @staticmethod
+    def rss(browser) -> int:
+        """chromedriver 及其全部子进程的常驻内存，没有 psutil 时返回 0"""
+        if psutil is None:
+            return 0
+        try:
+            proc = psutil.Process(browser.service.process.pid)
+            procs = [proc, *proc.children(recursive=True)]
+            metrics.gauge('browser_processes', len(procs))
+            return sum(p.memory_info().rss for p in procs)
+        except (psutil.Error, AttributeError):
+            return 0
+
+    def _discard(self, browser):
+        """关闭并移除一个浏览器"""
+        if browser is None:
+            return
+        with self._lock:
+            self._pages.pop(browser, None)
+            metrics.gauge('browsers', len(self._pages))
+            if browser in self._slot_of:
+                self._free_slots.append(self._slot_of.pop(browser))
+        try:
+            browser.quit()
+        except Exception as _e:
+            logger.warning('Quit browser error, %s', _e)
+
+    def close(self):
+        """关闭全部浏览器"""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            remains = list(self._pages)
+        for browser in remains:
+            self._discard(browser)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(**kwargs) -> BrowserPool:
+    """返回进程内共享的浏览器池，首次调用时以 kwargs 创建，并注册退出时关闭"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(**kwargs)
+            atexit.register(_pool.close)
+        return _pool
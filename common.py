@@ -1,6 +1,6 @@
 import time
 
 
-def local_time():
-    """返回当前时间的标准字符串格式"""
-    return time.strftime('%Y-%m-%d %H:%M:%S %z')
\ No newline at end of file
+def local_time(timestamp=None):
+    """返回当前时间（或指定时间戳）的标准字符串格式"""
+    return time.strftime('%Y-%m-%d %H:%M:%S %z', time.localtime(timestamp))
\ No newline at end of file
@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+本地持久化的去重索引，代替每次运行全量下载 page_id 与 link。
+
+每个配置一个目录，page_id 与 link 分别保存为内存映射文件上的开放寻址哈希集合，
+只保存键的 8 字节摘要；meta.json 记录与 Controller 同步的游标。
+"""
+import json
+import mmap
+import struct
+import threading
+import time
+from hashlib import md5
+from pathlib import Path
+from typing import Iterable
+
+__all__ = ['HashSet', 'DedupIndex']
+
+_MAGIC = b'DSAHSET1'
+_HEADER = struct.Struct('<8sQQQ')  # magic, capacity, count, tombstones
+_EMPTY, _DELETED = 0, 1
+
+
+class HashSet:
+    """内存映射文件上的字符串集合，支持 in / add / discard / len"""
+
+    def __init__(self, path: Path, capacity=1 << 14):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if not self.path.exists() or self.path.stat().st_size < _HEADER.size:
+            self._create(self.path, capacity)
+        self._open()
+
+    @staticmethod
+    def _create(path: Path, capacity):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, capacity, 0, 0))
+            f.truncate(_HEADER.size + capacity * 8)
+
+    def _open(self):
+        self._file = open(self.path, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, self._capacity, self._count, self._tombstones = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f'{self.path} is not a HashSet file.')
+        self._slots = memoryview(self._mm)[_HEADER.size:].cast('Q')
+
+    def _close(self):
+        self._slots.release()
+        self._mm.close()
+        self._file.close()
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        """8 字节摘要，0 与 1 保留为空槽和删除标记"""
+        h = int.from_bytes(md5(str(value).encode()).digest()[:8], 'little')
+        return h if h > _DELETED else h + 2
+
+    def _find(self, h) -> int:
+        """返回 h 所在的槽；不存在时返回可插入的槽（优先复用删除标记）"""
+        i = h % self._capacity
+        reuse = -1
+        while True:
+            slot = self._slots[i]
+            if slot == h:
+                return i
+            if slot == _EMPTY:
+                return i if reuse < 0 else reuse
+            if slot == _DELETED and reuse < 0:
+                reuse = i
+            i = (i + 1) % self._capacity
+
+    def _write_header(self):
+        _HEADER.pack_into(self._mm, 0, _MAGIC, self._capacity, self._count, self._tombstones)
+
+    def __contains__(self, value: str) -> bool:
+        h = self._hash(value)
+        with self._lock:
+            return self._slots[self._find(h)] == h
+
+    def __len__(self):
+        return self._count
+
+    def add(self, value: str):
+        h = self._hash(value)
+        with self._lock:
+            i = self._find(h)
+            if self._slots[i] == h:
+                return
+            if self._slots[i] == _DELETED:
+                self._tombstones -= 1
+            self._slots[i] = h
+            self._count += 1
+            self._write_header()
+            if (self._count + self._tombstones) * 10 > self._capacity * 6:  # 装载率超过 0.6 时扩容
+                self._resize(self._capacity * 2)
+
+    def update(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def discard(self, value: str):
+        h = self._hash(value)
+        with self._lock:
+            i = self._find(h)
+            if self._slots[i] == h:
+                self._slots[i] = _DELETED
+                self._count -= 1
+                self._tombstones += 1
+                self._write_header()
+
+    def clear(self):
+        with self._lock:
+            self._resize(self._capacity, keep=False)
+
+    def _resize(self, capacity, keep=True):
+        """重建到一个新的文件并替换，同时清除删除标记"""
+        hashes = [h for h in self._slots if h > _DELETED] if keep else []
+        _tmp = self.path.with_suffix('.tmp')
+        self._create(_tmp, capacity)
+        with open(_tmp, 'r+b') as f, mmap.mmap(f.fileno(), 0) as mm:
+            slots = memoryview(mm)[_HEADER.size:].cast('Q')
+            for h in hashes:
+                i = h % capacity
+                while slots[i] != _EMPTY:
+                    i = (i + 1) % capacity
+                slots[i] = h
+            slots.release()
+            _HEADER.pack_into(mm, 0, _MAGIC, capacity, len(hashes), 0)
+        self._close()
+        _tmp.replace(self.path)
+        self._open()
+
+    def flush(self):
+        with self._lock:
+            self._mm.flush()
+
+
+class DedupIndex:
+    """一个配置的去重索引：ids、links 两个集合，以及上一次同步的游标"""
+
+    FULL_SYNC_INTERVAL = 7 * 24 * 3600  # 定期全量同步，修正 Controller 端删除的 page
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.ids = HashSet(self.root.joinpath('ids.idx'))
+        self.links = HashSet(self.root.joinpath('links.idx'))
+        self._meta_file = self.root.joinpath('meta.json')
+        try:
+            self.meta: dict = json.loads(self._meta_file.read_text(encoding='utf8'))
+        except (OSError, ValueError):
+            self.meta = {}
+
+    @property
+    def cursor(self):
+        """增量同步的游标，需要全量同步时返回 None"""
+        if time.time() - self.meta.get('full_sync_at', 0) > self.FULL_SYNC_INTERVAL:
+            return None
+        return self.meta.get('cursor')
+
+    def synced(self, cursor, full: bool):
+        """记录一次同步完成"""
+        self.meta['cursor'] = cursor
+        if full:
+            self.meta['full_sync_at'] = time.time()
+        self.flush()
+
+    def flush(self):
+        self.ids.flush()
+        self.links.flush()
+        _tmp = self._meta_file.with_suffix('.tmp')
+        _tmp.write_text(json.dumps(self.meta), encoding='utf8')
+        _tmp.replace(self._meta_file)
@@ -1,16 +1,30 @@
 # coding: utf-8
+import codecs
+import gzip
 import json
 import logging
 import re
+import threading
 import time
-import zipfile
 from hashlib import md5
 from pathlib import Path
-from typing import Union
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
 
 import requests
 
+try:  # 可选依赖，更快的 JSON 解析
+    import orjson
+except ImportError:
+    orjson = None
+
+import log_queue
+import metrics
 from common import local_time
+from dedup import DedupIndex
+from log_archive import HTMLDumps, archive
+from pipeline import batched
+from scheduler import map_unordered
+from transport import CircuitBreaker, IDEMPOTENT_METHODS, RETRY_STATUS, backoff, pooled_adapter, retry_after
 
 logger = logging.getLogger('dsa.spider.dsa-client')
 __all__ = ['DSAClient', 'ActiveConfigNotFoundError']
@@ -20,77 +34,236 @@ class ActiveConfigNotFoundError(FileNotFoundError):
     pass
 
 
+_LOG_BODY = 512  # DEBUG 日志中响应体的最大长度(字节)
+_decoder = json.JSONDecoder()
+
+
+def _json(resp: requests.Response):
+    """解析 JSON 响应体，结果缓存在 resp 上，重复调用不再解析
+
+    直接解析 bytes，不做 Response.text 的编码探测；安装了 orjson 时使用 orjson。
+    """
+    if not hasattr(resp, '_dsa_json'):
+        resp._dsa_json = orjson.loads(resp.content) if orjson else json.loads(resp.content)
+    return resp._dsa_json
+
+
+def _status(resp: requests.Response):
+    """JSON 响应体中的 status 字段，响应体不是 JSON 对象时返回 None"""
+    try:
+        data = _json(resp)
+    except ValueError:
+        return None
+    return data.get('status') if isinstance(data, dict) else None
+
+
+def _iter_json_array(resp: requests.Response, key='data', chunk_size=64 * 1024) -> Iterator:
+    """从流式响应中逐个产出 {key: [...]} 或顶层列表中的元素，内存中只保留一个分块
+
+    假定 key 是响应中第一个名为 key 的字段(Controller 的响应格式)；{key: null} 视为空数组。
+    """
+    decode = codecs.getincrementaldecoder(resp.encoding or 'utf-8')(errors='replace').decode
+    chunks = resp.iter_content(chunk_size)
+    start = re.compile(r'^\s*\[|(?<!\\)"' + re.escape(key) + r'"\s*:\s*(?:\[|(null)\b)')
+    buf, pos, eof = '', None, False
+
+    def _more():
+        nonlocal buf, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buf += decode(b'', final=True)
+        else:
+            buf += decode(chunk)
+
+    while pos is None:  # 定位数组的开始
+        m = start.search(buf)
+        if m and m.group(1):  # null
+            return
+        elif m:
+            pos = m.end()
+        elif eof:
+            raise ValueError(f'No JSON array "{key}" in response.')
+        else:
+            _more()
+
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except ValueError:  # 元素不完整，读取下一个分块
+            if eof:
+                raise
+            buf, pos = buf[pos:], 0
+            _more()
+            continue
+        delim = end
+        while delim < len(buf) and buf[delim] in ' \t\r\n':
+            delim += 1
+        if not eof and (delim == len(buf) or buf[delim] not in ',]'):  # 元素之后还没有分隔符，数字可能被分块截断(如 1e|5)
+            buf, pos = buf[pos:], 0
+            _more()
+            continue
+        yield item
+        pos = end
+
+
 class DSAClient(requests.Session):
     """DSA Controller API 封装"""
 
     class Cache:
-        LOG_ID = None
-        EXIT_STATUS = 'Success'
-        COUNT_NEW_PAGE = 0
-        COUNT_UPDATE_TEXT = 0
-        NOT_FOUND_TEXT_IDS = []
-
-    def __init__(self, base_url='', auth=None):
+        """一次运行的状态与计数，每个客户端实例独立"""
+
+        def __init__(self):
+            self.LOG_ID = None
+            self.EXIT_STATUS = 'Success'
+            self.COUNT_NEW_PAGE = 0
+            self.COUNT_UPDATE_TEXT = 0
+            self.NOT_FOUND_TEXT_IDS = []
+            self.TEXT_SECONDS = 0.0  # load_text 耗时，用于计算吞吐量
+            self.LOCK = threading.Lock()  # 多线程更新计数时使用
+
+    def __init__(self, base_url='', auth=None, cache_dir: Path = Path('.cache'),
+                 timeout=(5, 30), retries=4, pool_size=16, html_dumps=50, html_dump_kb=256):
+        """
+        :param timeout: (连接超时, 读取超时) 秒，请求未指定 timeout 时使用
+        :param retries: 瞬时错误(连接失败、超时、429、5xx)的最大重试次数
+        :param pool_size: 长连接池的大小
+        :param html_dumps: logs/html 中保留的 HTML 错误页数量
+        :param html_dump_kb: 单个 HTML 错误页的大小上限 KB
+        """
         super().__init__()
+        self.Cache = DSAClient.Cache()
 
         self.base_url = base_url
+        self.cache_dir = Path(cache_dir)
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = CircuitBreaker()
+        self.mount('http://', pooled_adapter(pool_size))
+        self.mount('https://', pooled_adapter(pool_size))
         self.headers.update({'User-Agent': 'dsa-spider/0.1'})
         self.params: dict = {}
         if auth:
             self.headers.update({'Auth': auth})
+        self._heartbeat_session = None
+        self.metrics = metrics.registry  # status_data 上传的指标，worker 模式中为本配置的 metrics.scope()
+        self.html_dumps = HTMLDumps(Path('logs/html'), html_dumps, html_dump_kb * 1024)
 
     def request(self, method, url, *args, **kwargs):
         """重写 Session.request，
         1. 将URI拼接为完整的URL，发起调用；
-        2. 打印一些额外的日志；
+        2. 瞬时错误按指数退避重试，遵守 Retry-After；连续失败时由熔断器快速失败；
+        3. 打印一些额外的日志；
         """
         _url = self.base_url + url
         logger.debug('Join a New URL,[%s] %s', method, _url)
-
-        _resp = super().request(method, _url, *args, **kwargs)
-        if '<!DOCTYPE html>' in _resp.text:
-            Path(
-                f'logs/{method}_{url.replace("/", "_").replace(":", "")}.html'
-            ).write_text(_resp.text)
-            logger.warning('[%s] %s return a HTML , it will be saved at logs', method, url)
-        else:
-            logger.debug('[%s] %s >>> %s', method, url, _resp.text)
+        kwargs.setdefault('timeout', self.timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_status = RETRY_STATUS['idempotent' if idempotent else 'other']
+
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            if hasattr(kwargs.get('data'), 'seek'):  # 文件对象作为请求体时，重试前回到开头
+                kwargs['data'].seek(0)
+            try:
+                with metrics.timer('controller_request', endpoint=f'{method} {metrics.endpoint(url)}'):
+                    _resp = super().request(method, _url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as _e:
+                self.breaker.record(False)
+                # 非幂等的请求只在连接未建立时重试，读取超时时服务端可能已经处理
+                if attempt >= self.retries or not (idempotent or isinstance(_e, requests.ConnectTimeout)):
+                    raise
+                wait = backoff(attempt)
+                logger.info('[%s] %s Error, %s, retry in %.1fs', method, url, _e, wait)
+            else:
+                self.breaker.record(_resp.status_code < 500)
+                if _resp.status_code not in retry_status or attempt >= self.retries:
+                    break
+                wait = retry_after(_resp) or backoff(attempt)
+                logger.info('[%s] %s HTTP_CODE(%d), retry in %.1fs', method, url, _resp.status_code, wait)
+                _resp.close()
+            metrics.inc('controller_retries', endpoint=f'{method} {metrics.endpoint(url)}')
+            attempt += 1
+            time.sleep(wait)
+
+        metrics.inc('controller_responses', status=_resp.status_code)
+        if 'text/html' in _resp.headers.get('Content-Type', ''):  # 网关或服务端的错误页
+            _path = self.html_dumps.save(f'{method}_{url.replace("/", "_").replace(":", "")}', _resp.content)
+            logger.warning('[%s] %s return a HTML , it will be saved at %s', method, url, _path)
+        elif kwargs.get('stream'):  # 流式响应由调用方读取
+            logger.debug('[%s] %s >>> HTTP %d (stream)', method, url, _resp.status_code)
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[%s] %s >>> HTTP %d (%d bytes) %s', method, url, _resp.status_code, len(_resp.content),
+                         _resp.content[:_LOG_BODY].decode('utf8', errors='replace'))
         return _resp
 
-    def client_get(self, url, *args, retry=0, **kwargs
+    def fork(self) -> 'DSAClient':
+        """返回一个共享连接池和请求头、但拥有独立配置与计数的客户端，用于在一个进程中处理多个配置"""
+        client = type(self)(self.base_url, cache_dir=self.cache_dir, timeout=self.timeout, retries=self.retries)
+        client.headers.update(self.headers)
+        for prefix, adapter in self.adapters.items():
+            client.mount(prefix, adapter)
+        client.breaker = self.breaker  # 同一个 Controller，共享熔断状态
+        client.html_dumps = self.html_dumps
+        return client
+
+    def client_get(self, url, *args, **kwargs
                    ) -> Union[str, dict, list, int, type(None)]:
-        """附带判定和重试的get请求，返回一个API的REST Ful API 中data内容， 否则返回None
+        """附带判定的get请求，返回一个API的REST Ful API 中data内容， 否则返回None
+
+        瞬时错误的重试由 request 处理
         """
 
         _resp = self.get(url, *args, **kwargs)
 
         if _resp.status_code == 200:
-            _resp_json = _resp.json()
+            _resp_json = _json(_resp)
             # 尴尬的是_resp_json有可能是一个列表而不是一个字典
             return _resp_json.get('data') if isinstance(_resp_json, dict) else _resp_json
-        elif _resp.status_code == 406 and _resp.json()['status'] == 406:
+        elif _resp.status_code == 406 and _json(_resp)['status'] == 406:
             return None
         else:
             text = _resp.text
-            logger.warning(
+            logger.error(
                 'Get %s Error HTTP_CODE(%d), %s',
                 url,
                 _resp.status_code,
-                re.findall(r'<title>(.*?)</title>', text) or text
+                re.findall(r'<title>(.*?)</title>', text) or text[:_LOG_BODY]
             )
-            time.sleep(3)
-            if retry <= 3:
-                logger.info('Retry to get active config, times: %d', retry + 1)
-                return self.client_get(url, *args, retry=retry + 1, **kwargs)
-            else:
-                logger.error('Cannot access a %s from server.', url)
-                return None
+            return None
+
+    def client_iter(self, url, *args, **kwargs) -> Iterator:
+        """流式读取列表接口，逐个产出 data 中的元素，用于 /apis/pages 等大响应
+
+        瞬时错误的重试由 request 处理；与 client_get 相同，406 且 status 为 406 (没有数据)时视为空列表；
+        其它非 200 或无法解析的响应抛出 requests.RequestException，不再重新请求
+        """
+        with self.get(url, *args, stream=True, **kwargs) as _resp:
+            if _resp.status_code == 406 and _status(_resp) == 406:
+                return
+            if _resp.status_code != 200:
+                logger.error('Get %s Error HTTP_CODE(%d), %s', url, _resp.status_code, _resp.content[:_LOG_BODY])
+                raise requests.RequestException(f'Cannot access a {url} from server, HTTP_CODE({_resp.status_code})',
+                                                response=_resp)
+            try:
+                if 'json' in _resp.headers.get('Content-Type', ''):
+                    yield from _iter_json_array(_resp)
+                    return
+                data = _json(_resp)  # Content-Type 不是 JSON 时整体解析
+            except ValueError as _e:
+                raise requests.RequestException(f'Cannot parse {url}, {_e}', response=_resp) from _e
+        yield from (data.get('data') if isinstance(data, dict) else data) or []
 
     _active_config = None
 
     def active_config(self, force_config=None):
         """从 Controller 获取到指定的配置，并缓存"""
-        logger.info(f'{type(self._active_config)} - {self._active_config}')
+        logger.debug('Cached active config: %s', self._active_config)
         if self._active_config is not None and self._active_config:
             logger.info('DSA Active Config From Cache. name: %s', self._active_config.get('name'))
             return self._active_config
@@ -108,67 +281,124 @@ class DSAClient(requests.Session):
             logger.error('Cannot access a config from server. _resp: %s', _resp)
             raise ActiveConfigNotFoundError()
 
-    _page_ids = None
+    SYNC_OVERLAP = 3600  # 增量同步的游标向前回退的秒数，容忍两端的时钟偏差
+    _dedup = None
 
     @property
-    def page_ids(self) -> set:
-        """返回获取active Config 的Page ID，并缓存"""
-        if isinstance(self._page_ids, set):
-            return self._page_ids
+    def dedup(self) -> DedupIndex:
+        """active Config 的本地去重索引，首次使用时与 Controller 增量同步"""
+        if self._dedup is None:
+            self._dedup = DedupIndex(self.cache_dir.joinpath('dedup', str(self._active_config['id'])))
+            self.sync_dedup()
+        return self._dedup
 
-        _resp = self.client_get(f'/apis/pages/id')
-        self._page_ids = set(_resp or set())
-        return self.page_ids
+    def sync_dedup(self):
+        """只下载游标之后新增的 page_id 与 link；没有游标时全量下载
 
-    _page_links = None
+        Controller 不认识 since 参数时会返回全量数据，结果同样正确。
+        """
+        cursor = self._dedup.cursor
+        next_cursor = local_time(time.time() - self.SYNC_OVERLAP)
+        params = {'since': cursor} if cursor else {}
+        logger.info('Sync dedup index of config %s, since: %s', self._active_config['id'], cursor)
+
+        def _sync(hash_set, url):
+            """逐个写入索引，不在内存中保留完整的列表；全量同步在收到响应后才清空本地索引"""
+            items = self.client_iter(url, params=params)
+            first = next(items, items)  # 空列表时返回 items 本身
+            if cursor is None:
+                hash_set.clear()
+            if first is not items:
+                hash_set.add(first)
+                hash_set.update(items)
+
+        try:
+            _sync(self._dedup.ids, '/apis/pages/id')
+            _sync(self._dedup.links, '/apis/pages/link')
+        except requests.RequestException as _e:
+            # 游标不前进，下一次重新同步；已写入的部分都是 Controller 上存在的记录
+            logger.warning('Cannot sync dedup index from server, use the local index. %s', _e)
+            self._dedup.flush()
+            return
+        self._dedup.synced(next_cursor, full=cursor is None)
+        logger.info('Dedup index synced, %d ids, %d links.', len(self._dedup.ids), len(self._dedup.links))
 
     @property
-    def page_links(self) -> set:
-        """返回active config 的 Page_link, 并缓存"""
-        if isinstance(self._page_links, set):
-            return self._page_links
+    def page_ids(self):
+        """active Config 的 Page ID 集合"""
+        return self.dedup.ids
 
-        _resp = self.client_get('/apis/pages/link')
-        self._page_links = set(_resp or set())
-        return self.page_links
+    @property
+    def page_links(self):
+        """active Config 的 Page_link 集合"""
+        return self.dedup.links
 
     def force_update_ips_from_pages(self):
         """从Page中更新IPS links"""
         logger.warning('正在从pages接口更新_page_ids, page_links')
-        pages = self.client_get('/apis/pages')
-        self._page_ids = {i['page_id'] for i in pages}
-        self._page_links = {i['link'] for i in pages}
+        self.page_ids.clear()
+        self.page_links.clear()
+        for page in self.client_iter('/apis/pages'):
+            self.page_ids.add(page['page_id'])
+            self.page_links.add(page['link'])
+        self.dedup.flush()
 
     def heartbeat(self):
         """向Controller发送一个心跳，表明当前配置活跃"""
         param = {'config_id': self._active_config['id']}
         logger.info('send a heartbeat to server.')
-        _resp = self.get('/apis/config/heartbeat', params=param)
-        if _resp.status_code == 200 and _resp.json()['status'] == 200:
+        try:
+            _resp = self.heartbeat_session.get(self.base_url + '/apis/config/heartbeat',
+                                               params=dict(self.params, **param), timeout=self.timeout)
+        except requests.RequestException as _e:
+            logger.warning('Send heartbeat Error, %s', _e)
+            return
+        if _resp.status_code == 200 and _json(_resp)['status'] == 200:
             return True
         return
 
-    def page_create(self, body: dict):
-        """向 Controller 创建一个新的page"""
+    @property
+    def heartbeat_session(self) -> requests.Session:
+        """心跳线程专用的会话，不与工作线程共享 Session，也不受熔断器影响"""
+        if self._heartbeat_session is None:
+            self._heartbeat_session = requests.Session()
+            self._heartbeat_session.headers.update(self.headers)
+        return self._heartbeat_session
+
+    def _is_new_page(self, body: dict) -> bool:
+        """为 body 生成 page_id，并判断是否是一个新的page"""
         body['page_id'] = md5(f'{body["source"]}{body["title"]}{body["link"]}'.encode()).hexdigest()
         logger.info('Create a Page to Server, %s, %s', body['page_id'], body['title'])
 
         if body['page_id'] in self.page_ids:  # 判断page_id 是否重复
             logger.warning('duplication page_id %s, skip.', body['page_id'])
-            return
+            return False
 
         if body['link'] in self.page_links:  # 判定 page_link 是否重重
             logger.warning('duplication Page Link %s, skip.', body['link'])
+            return False
+        return True
+
+    def page_create(self, body: dict):
+        """向 Controller 创建一个新的page"""
+        if not self._is_new_page(body):
             return
 
         _resp = self.post(f'/apis/page/{body["page_id"]}/', json=body)
-        if _resp.status_code == 200 and _resp.json()['status'] == 200:
-            logger.info('Page [%s] is created at Server. ID: %s', body["title"], body['page_id'])
-            self.Cache.COUNT_NEW_PAGE += 1
+        if _resp.status_code == 200 and _json(_resp)['status'] == 200:
+            self._page_created(body)
             return body['page_id']
-        logger.warning(f'create page [%s] is Error, %s', body["title"], _resp.json()['message'])
+        logger.warning(f'create page [%s] is Error, %s', body["title"], _json(_resp)['message'])
         return None
 
+    def _page_created(self, body: dict):
+        """page 创建成功后计数，并加入去重集合"""
+        logger.info('Page [%s] is created at Server. ID: %s', body["title"], body['page_id'])
+        with self.Cache.LOCK:
+            self.Cache.COUNT_NEW_PAGE += 1
+        self.page_ids.add(body['page_id'])
+        self.page_links.add(body['link'])
+
     def page_update(self, body: dict):
         """更新Page text 到 Controller"""
         if not body.get('page_id'):
@@ -179,12 +409,121 @@ class DSAClient(requests.Session):
             body['page_id'] = md5(f'{body["source"]}{body["title"]}{body["link"]}'.encode()).hexdigest()
 
         _resp = self.put(f'/apis/page/{body["page_id"]}/', json=body)
-        if _resp.status_code == 200 and _resp.json()['status'] == 200:
+        if _resp.status_code == 200 and _json(_resp)['status'] == 200:
             logger.info('Page %s of text is updated at Server. Len(%s)', body["page_id"], len(body['text']))
-            self.Cache.COUNT_UPDATE_TEXT += 1
-            return _resp.json()
+            with self.Cache.LOCK:
+                self.Cache.COUNT_UPDATE_TEXT += 1
+            return _json(_resp)
         return
 
+    # 批量接口：/apis/pages/bulk/ 接收 gzip 压缩的 {"pages": [...]}，
+    # 返回 {"status": 200, "data": [{"page_id": ..., "status": 200, "message": ...}, ...]}
+    BULK_URL = '/apis/pages/bulk/'
+    _bulk_supported = True
+
+    @property
+    def bulk_supported(self) -> bool:
+        return self._bulk_supported
+
+    @staticmethod
+    def bulk_request(batch: List[dict]) -> dict:
+        """批量接口的请求参数(data 与 headers)"""
+        return dict(
+            data=gzip.compress(json.dumps({'pages': batch}, ensure_ascii=False).encode(), compresslevel=5),
+            headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'},
+        )
+
+    def bulk_results(self, method, batch: List[dict], status_code, resp_json) -> Union[Dict[str, bool], None]:
+        """解析批量接口的响应，返回每个 page_id 是否成功；Controller 不支持批量接口时返回 None，之后逐个发送"""
+        if status_code in (404, 405, 501):
+            logger.warning('Controller does not support %s %s, fall back to single calls.', method, self.BULK_URL)
+            self._bulk_supported = False
+            return None
+        if status_code == 200 and isinstance(resp_json, dict) and resp_json.get('status') == 200:
+            items = {i['page_id']: i.get('status') == 200 for i in resp_json.get('data') or []}
+            missing = sum(body['page_id'] not in items for body in batch)
+            if missing:  # 响应中没有的 page 视为失败，下次运行时重试
+                logger.warning('Bulk %s response is missing %d / %d pages.', method, missing, len(batch))
+            return {body['page_id']: items.get(body['page_id'], False) for body in batch}
+        logger.warning('Bulk %s Error HTTP_CODE(%d), batch size: %d', method, status_code, len(batch))
+        return {body['page_id']: False for body in batch}
+
+    def _send_bulk(self, method, batch: List[dict]) -> Dict[str, bool]:
+        """发送一个批次，返回每个 page_id 是否成功；Controller 不支持批量接口时逐个发送"""
+        if self._bulk_supported:
+            _resp = self.request(method, self.BULK_URL, **self.bulk_request(batch))
+            _results = self.bulk_results(method, batch, _resp.status_code,
+                                         _json(_resp) if _resp.status_code == 200 else None)
+            if _results is not None:
+                return _results
+
+        results = {}
+        for body in batch:
+            try:
+                _resp = self.request(method, f'/apis/page/{body["page_id"]}/', json=body)
+                results[body['page_id']] = _resp.status_code == 200 and _json(_resp)['status'] == 200
+            except Exception as _e:
+                logger.warning('%s page %s Error, %s', method, body['page_id'], _e)
+                results[body['page_id']] = False
+        return results
+
+    def _pipelined(self, method, bodies: Iterable[dict], batch_size, max_wait, workers
+                   ) -> Iterator[Tuple[List[dict], Dict[str, bool]]]:
+        """将 bodies 分批并发发送，按完成顺序产出 (batch, {page_id: 是否成功})，单个批次的失败不影响其它批次"""
+        for batch, _result, _e in map_unordered(lambda _batch: self._send_bulk(method, _batch),
+                                                batched(bodies, batch_size, max_wait),
+                                                workers=workers):
+            if _e is not None:
+                logger.warning('Bulk %s Error, %s', method, _e)
+                _result = {body['page_id']: False for body in batch}
+            yield batch, _result
+
+    def page_create_many(self, bodies: Iterable[dict], batch_size=50, max_wait=5.0, workers=4) -> Dict[str, bool]:
+        """批量创建page，返回 {page_id: 是否成功}，重复的page不在结果中
+
+        bodies 可以是一个流式的迭代器(None 视为空闲心跳)，同时在途的批次数有上限。
+        """
+
+        def _new_pages():
+            for body in bodies:
+                if body is None or self._is_new_page(body):
+                    if body is not None:
+                        self.page_ids.add(body['page_id'])  # 避免同一批次内的重复
+                        self.page_links.add(body['link'])
+                    yield body
+
+        results = {}
+        for batch, _result in self._pipelined('POST', _new_pages(), batch_size, max_wait, workers):
+            for body in batch:
+                if _result[body['page_id']]:
+                    self._page_created(body)
+                else:
+                    self.page_ids.discard(body['page_id'])  # 失败的page下次仍可以重试
+                    self.page_links.discard(body['link'])
+                    logger.warning('create page [%s] is Error.', body['title'])
+            results.update(_result)
+        if self._dedup is not None:
+            self._dedup.flush()
+        return results
+
+    def page_update_many(self, bodies: Iterable[dict], batch_size=20, max_wait=5.0, workers=4) -> Dict[str, bool]:
+        """批量更新page text，返回 {page_id: 是否成功}，bodies 同 page_create_many"""
+        results = {}
+        for _, _result in self._pipelined('PUT', bodies, batch_size, max_wait, workers):
+            self.record_updates(_result)
+            results.update(_result)
+        logger.info('Page text is updated at Server, %d / %d', sum(results.values()), len(results))
+        return results
+
+    def record_updates(self, results: Dict[str, bool]):
+        """记录一个批次的正文更新结果"""
+        for page_id, ok in results.items():
+            if ok:
+                with self.Cache.LOCK:
+                    self.Cache.COUNT_UPDATE_TEXT += 1
+            else:
+                logger.warning('Update text of page %s is Error.', page_id)
+
     def page_del(self, page_id):
         """删除一个配置 TODO 未实现"""
         logger.warning('')
@@ -206,35 +545,39 @@ class DSAClient(requests.Session):
         }
         _resp = self.post('/apis/log/create', json=body)
 
-        if _resp.status_code == 200 and _resp.json()['status'] == 200:
-            self.Cache.LOG_ID = _resp.json()['id']
+        if _resp.status_code == 200 and _json(_resp)['status'] == 200:
+            self.Cache.LOG_ID = _json(_resp)['id']
         else:
-            logger.error('Cannot Create log at Server, %s', _resp.json()['message'])
+            logger.error('Cannot Create log at Server, %s', _json(_resp)['message'])
 
-    def upload_logs(self):
-        """上传日志"""
-        with zipfile.ZipFile(f'log_{self.Cache.LOG_ID}.zip', 'w', compresslevel=9) as zz:
-            for f in Path('logs').iterdir():
-                zz.write(f)
+    def upload_logs(self, path: Path = Path('logs')):
+        """上传日志，压缩包写入临时文件，从文件流式上传
 
-            zz.fp.seek(0)
-            _resp = self.post(f'/apis/log/{self.Cache.LOG_ID}/upload', data=zz.fp.read())
+        :param path: 日志目录或单个日志文件，worker 模式中只上传配置自己的日志文件
+        """
+        log_queue.flush()  # 队列中尚未写入文件的日志
+        with archive(path) as fp:
+            _resp = self.post(f'/apis/log/{self.Cache.LOG_ID}/upload', data=fp)
 
-        if _resp.status_code == 200 and _resp.json()['status'] == 200:
+        if _resp.status_code == 200 and _json(_resp)['status'] == 200:
             return
 
-    def at_exit(self):
-        """将被注册到退出函数中的事件。"""
-        logger.info('Client on Exit.')
-        data = dict(
+    def status_data(self) -> dict:
+        """本次运行的状态"""
+        return dict(
             end_time=local_time(),
             num_new_page=self.Cache.COUNT_NEW_PAGE,
             num_update_text=self.Cache.COUNT_UPDATE_TEXT,
             not_found_text_pages=self.Cache.NOT_FOUND_TEXT_IDS,
             status=self.Cache.EXIT_STATUS,
+            metrics=self.metrics.summary(),
         )
+
+    def at_exit(self):
+        """将被注册到退出函数中的事件。"""
+        logger.info('Client on Exit.')
         self.upload_logs()
-        self.upload_status(data)
+        self.upload_status(self.status_data())
 
     def upload_status(self, data: dict):
         """上传状态"""
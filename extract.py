@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+不依赖浏览器的正文提取：输入原始 HTML(静态抓取的响应或浏览器的 page_source)。
+
+1. 配置了 selector_page 时取选择器命中的元素；
+2. 否则去除导航、页眉页脚、侧栏、分享、评论等样板内容，再按文本密度找出正文所在的元素；
+3. 取可见文本，块级元素之间换行。
+
+TextExtractor 按内容摘要保存页面快照与提取结果：同一页面不重复提取，
+修改选择器后可以从快照中重新提取，不需要重新抓取站点。
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from hashlib import sha1
+from pathlib import Path
+from typing import List, Optional, Union
+
+import html_static
+import metrics
+
+__all__ = ['TextExtractor', 'extract_text', 'main_content', 'strip_boilerplate']
+
+# 不包括 form：ASP.NET WebForms 的页面整个 body 都在 <form id="aspnetForm"> 中
+_BOILERPLATE_TAGS = {'nav', 'header', 'footer', 'aside', 'iframe', 'button', 'select', 'dialog'}
+_INVISIBLE_TAGS = {'script', 'style', 'noscript', 'template'}
+# class / id 中的完整单词，no-sidebar、has-sidebar 等主题的 body class 不匹配
+_BOILERPLATE_TOKENS = frozenset('''
+nav navbar menu footer sidebar breadcrumb breadcrumbs comment comments share social related recommend
+ad ads advert advertisement banner cookie popup modal pager pagination copyright
+'''.split())
+# 不移除的元素
+_KEEP_TAGS = {'html', 'body', 'main'}
+# 包含超过该比例文本的元素不视为样板内容
+_MAX_BOILERPLATE_SHARE = 0.5
+# 作为段落统计的最短文本长度
+_MIN_PARAGRAPH = 25
+# 正文元素的最低得分，低于该值时取整个 body
+_MIN_SCORE = 5
+# 提取规则的版本，修改规则后递增，使缓存的提取结果失效
+_VERSION = 3
+_PUNCTUATION = re.compile(r'[，。；！？、,.;!?]')
+
+
+def _is_boilerplate(ele) -> bool:
+    if ele.tag in _BOILERPLATE_TAGS:
+        return True
+    tokens = f'{ele.get("class", "")} {ele.get("id", "")}'.lower().split()
+    return any(token in _BOILERPLATE_TOKENS for token in tokens)
+
+
+def strip_boilerplate(root):
+    """就地移除 root 下的样板内容与不可见元素；包含大部分文本的元素即使看起来像样板也保留"""
+    invisible = [ele for ele in root.iter(*_INVISIBLE_TAGS) if ele is not root]
+    for ele in invisible:
+        ele.drop_tree()
+
+    total = len(root.text_content()) or 1
+    drop = []
+    for ele in root.iter():
+        if ele is root or not isinstance(ele.tag, str) or ele.tag in _KEEP_TAGS:
+            continue
+        if _is_boilerplate(ele) and len(ele.text_content()) <= total * _MAX_BOILERPLATE_SHARE:
+            drop.append(ele)
+    for ele in drop:
+        ele.drop_tree()
+    return root
+
+
+def _own_text(ele) -> str:
+    """元素自身的文本，不包括子元素的文本，但包括子元素之后的文本(tail)"""
+    return (ele.text or '') + ''.join(child.tail or '' for child in ele)
+
+
+def main_content(doc):
+    """按文本密度找出正文所在的元素
+
+    每个文本段落(自身文本足够长的元素)按长度与标点数计分，分数累加到父元素与祖父元素(一半)，
+    得分乘以 (1 - 链接文本占比) 后最高的元素即为正文；没有足够的文本时返回 body。
+    """
+    body = doc.find('body')
+    body = body if body is not None else doc
+    scores = {}
+    for ele in body.iter():
+        if not isinstance(ele.tag, str):
+            continue
+        text = _own_text(ele).strip()
+        if len(text) < _MIN_PARAGRAPH:
+            continue
+        score = 1 + min(len(text) / 100, 3) + len(_PUNCTUATION.findall(text))
+        parent = ele.getparent()
+        if parent is None:
+            continue
+        # 纯文本元素(如 <p>)的分数记在其容器上，div 中直接书写的文本记在 div 本身
+        container = parent if ele.tag in ('p', 'pre', 'blockquote', 'span', 'font', 'strong', 'em', 'b') else ele
+        scores[container] = scores.get(container, 0) + score
+        grandparent = container.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + score / 2
+
+    best, best_score = body, _MIN_SCORE
+    for ele, score in scores.items():
+        text_len = len(ele.text_content()) or 1
+        link_len = sum(len(a.text_content()) for a in ele.iter('a'))
+        score *= 1 - link_len / text_len
+        if score > best_score:
+            best, best_score = ele, score
+    return best
+
+
+def extract_text(doc, selectors: List[str] = None) -> str:
+    """提取正文，selectors 为空时去除样板内容后按文本密度识别；选择器没有命中时返回空字符串
+
+    选择器命中的元素视为正文，不去除其中的样板内容。
+    """
+    if selectors:
+        elements = html_static.select(doc, selectors)
+        return '\n'.join(filter(None, (html_static.element_text(ele) for ele in elements)))
+    strip_boilerplate(doc)
+    return html_static.element_text(main_content(doc))
+
+
+class TextExtractor:
+    """带缓存的正文提取
+
+    快照(压缩的 HTML)与提取结果保存在一个 SQLite 文件中，提取结果以 (内容摘要, 选择器) 为键；
+    超过 keep_days 天没有再抓取的快照在打开时清理。
+    """
+
+    def __init__(self, root: Path, keep_days=30):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.root.joinpath('extract.sqlite'), check_same_thread=False)
+        self._db.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS snapshots (url TEXT PRIMARY KEY, digest TEXT NOT NULL, fetched REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, html BLOB NOT NULL, is_text INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS texts (digest TEXT, selectors TEXT, text TEXT, PRIMARY KEY (digest, selectors));
+        ''')
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM snapshots WHERE fetched < ?', (time.time() - keep_days * 24 * 3600,))
+            self._db.execute('DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM snapshots)')
+            self._db.execute('DELETE FROM texts WHERE digest NOT IN (SELECT digest FROM snapshots)')
+
+    @staticmethod
+    def _key(selectors: Optional[List[str]]) -> str:
+        return json.dumps([_VERSION, selectors or []], ensure_ascii=False)
+
+    def _cached(self, digest, key) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute('SELECT text FROM texts WHERE digest = ? AND selectors = ?', (digest, key)).fetchone()
+        return row[0] if row else None
+
+    def _extract(self, url, digest, markup: Union[str, bytes], selectors) -> str:
+        with metrics.timer('extract_text'):
+            text = extract_text(html_static.parse_html(markup, url), selectors)
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO texts VALUES (?, ?, ?)', (digest, self._key(selectors), text))
+        return text
+
+    def extract(self, url, markup: Union[str, bytes], selectors: List[str] = None) -> str:
+        """提取并保存页面快照，相同的内容与选择器直接返回缓存的结果
+
+        :param markup: 已解码的 str，或交给 lxml 按 <meta charset> 解码的 bytes
+        """
+        is_text = isinstance(markup, str)
+        data = markup.encode() if is_text else markup
+        digest = sha1(data).hexdigest()
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)', (url, digest, time.time()))
+            self._db.execute('INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)', (digest, zlib.compress(data), is_text))
+        text = self._cached(digest, self._key(selectors))
+        return text if text is not None else self._extract(url, digest, markup, selectors)
+
+    def reextract(self, url, selectors: List[str] = None) -> Optional[str]:
+        """从 url 最近一次的快照中提取，没有快照时返回 None"""
+        with self._lock:
+            row = self._db.execute('SELECT digest FROM snapshots WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        text = self._cached(row[0], self._key(selectors))
+        if text is not None:
+            return text
+        with self._lock:
+            data, is_text = self._db.execute('SELECT html, is_text FROM blobs WHERE digest = ?', (row[0],)).fetchone()
+        data = zlib.decompress(data)
+        return self._extract(url, row[0], data.decode() if is_text else data, selectors)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+正文指纹：精确的内容摘要 + 64 位 SimHash。
+
+每个配置一个 SQLite 索引，SimHash 切分为 4 段 16 位分别建立索引，
+海明距离不超过 3 的两个指纹至少有一段完全相同，查找时只需比较候选集合。
+"""
+import heapq
+import json
+import sqlite3
+import threading
+from collections import Counter
+from hashlib import blake2b, sha1
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+__all__ = ['Fingerprint', 'Match', 'FingerprintIndex', 'fingerprint', 'simhash']
+
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+_SHINGLE = 4  # 字符 n-gram，对中文和英文都适用
+_MAX_FEATURES = 4096
+
+
+class Fingerprint(NamedTuple):
+    digest: str  # 规范化正文的 sha1
+    simhash: int  # 64 位无符号整数
+
+
+class Match(NamedTuple):
+    page_id: str
+    exact: bool
+    distance: int
+    keywords: List[str]
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def simhash(text: str) -> int:
+    """字符 n-gram 的 64 位 SimHash，n-gram 按出现次数加权
+
+    长文本只取哈希值最小的 _MAX_FEATURES 个 n-gram(一致性采样)，相似的正文采样到的 n-gram 也相似。
+    """
+    shingles = Counter(text[i:i + _SHINGLE] for i in range(max(len(text) - _SHINGLE + 1, 1)))
+    features = [(int.from_bytes(blake2b(shingle.encode(), digest_size=8).digest(), 'little'), count)
+                for shingle, count in shingles.items()]
+    if len(features) > _MAX_FEATURES:
+        features = heapq.nsmallest(_MAX_FEATURES, features)
+
+    weights = [0] * 64
+    for h, count in features:
+        for bit in range(64):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def fingerprint(text: str) -> Fingerprint:
+    text = _normalize(text)
+    return Fingerprint(sha1(text.encode()).hexdigest(), simhash(text))
+
+
+def _signed(value: int) -> int:
+    """SQLite INTEGER 是有符号的 64 位整数"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(value: int) -> List[int]:
+    return [value >> (i * _BAND_BITS) & ((1 << _BAND_BITS) - 1) for i in range(_BANDS)]
+
+
+class FingerprintIndex:
+    """一个配置的正文指纹索引
+
+    :param max_distance: 海明距离不超过该值视为近似重复，最大为 _BANDS - 1
+    """
+
+    def __init__(self, path: Path, max_distance=3):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_distance = min(max_distance, _BANDS - 1)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id TEXT PRIMARY KEY, digest TEXT NOT NULL, simhash INTEGER NOT NULL, keywords TEXT
+            );
+            CREATE INDEX IF NOT EXISTS pages_digest ON pages (digest);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, value INTEGER, page_id TEXT);
+            CREATE INDEX IF NOT EXISTS bands_value ON bands (band, value);
+        ''')
+
+    def match(self, fp: Fingerprint) -> Optional[Match]:
+        """查找相同或近似的正文，精确匹配优先"""
+        with self._lock:
+            row = self._db.execute('SELECT page_id, keywords FROM pages WHERE digest = ? LIMIT 1',
+                                   (fp.digest,)).fetchone()
+            if row:
+                return Match(row[0], True, 0, json.loads(row[1] or '[]'))
+
+            candidates = self._db.execute(
+                'SELECT DISTINCT p.page_id, p.simhash, p.keywords FROM bands b JOIN pages p ON p.page_id = b.page_id '
+                'WHERE ' + ' OR '.join(['(b.band = ? AND b.value = ?)'] * _BANDS),
+                [v for band in enumerate(_bands(fp.simhash)) for v in band],
+            ).fetchall()
+
+        best = None
+        for page_id, value, keywords in candidates:
+            distance = bin((value % (1 << 64)) ^ fp.simhash).count('1')
+            if distance <= self.max_distance and (best is None or distance < best.distance):
+                best = Match(page_id, False, distance, json.loads(keywords or '[]'))
+        return best
+
+    def add(self, page_id, fp: Fingerprint, keywords: List[str]):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM bands WHERE page_id = ?', (page_id,))
+            self._db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                             (page_id, fp.digest, _signed(fp.simhash), json.dumps(keywords, ensure_ascii=False)))
+            self._db.executemany('INSERT INTO bands VALUES (?, ?, ?)',
+                                 [(band, value, page_id) for band, value in enumerate(_bands(fp.simhash))])
+
+    def close(self):
+        with self._lock:
+            self._db.close()
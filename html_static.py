@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+不启动浏览器的静态页面抓取：requests 获取页面，lxml 解析，cssselect 执行与 Selenium 相同的 CSS 选择器。
+"""
+import logging
+import re
+from typing import List, Union
+
+import lxml.html
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+__all__ = ['session', 'fetch', 'parse', 'parse_html', 'markup', 'select', 'element_text']
+
+logger = logging.getLogger('dsa.spider.static')
+
+UA = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+      'Chrome/114.0.0.0 Safari/537.36')
+
+# 不可见的内容，取文本时跳过
+_SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'head'}
+# 块级元素，取文本时前后换行，近似 Selenium 的 WebElement.text
+_BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset',
+               'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header',
+               'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'tr', 'ul'}
+
+# <meta charset> 或 <?xml encoding?> 中声明的编码
+_DECLARED_CHARSET = re.compile(rb'<meta[^>]+charset|<\?xml[^>]+encoding', re.I)
+# 开头的 XML 声明，lxml 不接受带 encoding 声明的 str
+_XML_DECLARATION = re.compile(r'^\ufeff?\s*<\?xml[^>]*\?>')
+
+session = requests.Session()
+session.headers.update({'User-Agent': UA})
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+session.mount('http://', _adapter)
+session.mount('https://', _adapter)
+# 按 host 记录站点请求的耗时(到收到响应头为止)
+session.hooks['response'].append(
+    lambda resp, *args, **kwargs: metrics.observe('site_request_seconds', resp.elapsed.total_seconds(),
+                                                  host=metrics.host(resp.url))
+)
+
+
+def fetch(url, timeout=15) -> requests.Response:
+    """通过连接池获取页面，非 2xx 抛出异常"""
+    _resp = session.get(url, timeout=timeout)
+    _resp.raise_for_status()
+    return _resp
+
+
+def parse(resp: requests.Response):
+    """解析为 lxml 文档，并以最终 URL 为 base_url 方便补全相对链接"""
+    return parse_html(markup(resp), resp.url)
+
+
+def markup(resp: requests.Response) -> Union[str, bytes]:
+    """响应头声明了编码时按响应头解码，否则返回 bytes，交给 lxml 从 <meta charset> 中识别"""
+    if 'charset' in resp.headers.get('Content-Type', '').lower():
+        return resp.text
+    return resp.content
+
+
+def parse_html(markup: Union[str, bytes], url):
+    """解析 str 或 bytes，并以 url 补全相对链接
+
+    bytes 中没有声明编码时按 UTF-8 解码，libxml2 默认的 latin-1 会使中文变为乱码；
+    str 已经解码，去掉开头的 XML 声明，否则 lxml 抛出 ValueError。
+    """
+    if isinstance(markup, str):
+        markup = _XML_DECLARATION.sub('', markup, count=1)
+    elif not _DECLARED_CHARSET.search(markup[:2048]):
+        try:
+            markup = markup.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    doc = lxml.html.document_fromstring(markup, base_url=url)
+    doc.make_links_absolute(url, handle_failures='ignore')
+    return doc
+
+
+def select(doc, selectors: List[str]) -> list:
+    """依次执行多个 CSS 选择器，并将结果整合到一起"""
+    return [ele for selector in selectors for ele in doc.cssselect(selector)]
+
+
+def element_text(ele) -> str:
+    """元素的可见文本，块级元素之间换行"""
+    parts = []
+
+    def _walk(node):
+        if not isinstance(node.tag, str) or node.tag in _SKIP_TAGS:  # 注释、处理指令等
+            if node.tail and node is not ele:
+                parts.append(node.tail)
+            return
+        block = node.tag in _BLOCK_TAGS
+        if block:
+            parts.append('\n')
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            _walk(child)
+        if block:
+            parts.append('\n')
+        if node.tail and node is not ele:
+            parts.append(node.tail)
+
+    _walk(ele)
+    lines = (' '.join(line.split()) for line in ''.join(parts).splitlines())
+    return '\n'.join(line for line in lines if line)
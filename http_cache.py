@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+按 URL 持久化的 HTTP 响应缓存：保存 ETag / Last-Modified / 内容摘要和压缩后的正文，
+再次请求时发送条件请求，源站返回 304 或内容摘要不变时说明列表页没有更新。
+"""
+import gzip
+import json
+import logging
+import threading
+import time
+from hashlib import sha1, sha256
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+__all__ = ['HTTPCache', 'CachedResponse', 'NotModified']
+
+logger = logging.getLogger('dsa.spider.http-cache')
+
+
+class NotModified(Exception):
+    """源站内容自上次成功处理后没有变化"""
+
+
+class CachedResponse:
+    """与 requests.Response 接口相近的响应，not_modified 表示内容与缓存相同"""
+
+    def __init__(self, url, content: bytes, headers: dict, not_modified=False):
+        self.url = url
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+        self.not_modified = not_modified
+
+    @property
+    def text(self) -> str:
+        encoding = get_encoding_from_headers(self.headers) or 'utf-8'
+        return self.content.decode(encoding, errors='replace')
+
+
+class HTTPCache:
+    """条件请求缓存，正文总大小超过 max_bytes 时淘汰最久未使用的条目
+
+    fetch 的结果先暂存，调用方处理成功后调用 commit 才写入磁盘，
+    这样处理失败时下一次运行不会因为 304 而跳过。
+    """
+
+    def __init__(self, root: Path, max_bytes=64 * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._index_file = self.root.joinpath('index.json')
+        self._lock = threading.Lock()
+        self._pending = {}  # url -> (entry, content)
+        try:
+            self._index: dict = json.loads(self._index_file.read_text(encoding='utf8'))
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _body_file(self, url) -> Path:
+        return self.root.joinpath('bodies', sha1(url.encode()).hexdigest() + '.gz')
+
+    def _cached_body(self, url):
+        try:
+            return gzip.decompress(self._body_file(url).read_bytes())
+        except OSError:
+            return None
+
+    def fetch(self, session: requests.Session, url, timeout=15) -> CachedResponse:
+        """发起条件请求，非 2xx/304 抛出异常"""
+        with self._lock:
+            entry = dict(self._index.get(url) or {})
+        cached = self._cached_body(url) if entry else None
+
+        headers = {}
+        if cached is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        _resp = session.get(url, headers=headers, timeout=timeout)
+        if _resp.status_code == 304 and cached is not None:
+            logger.info('%s is not modified (304).', url)
+            entry['atime'] = time.time()
+            self._pending[url] = entry, None
+            return CachedResponse(url, cached, {'Content-Type': entry.get('content_type', '')}, not_modified=True)
+        _resp.raise_for_status()
+
+        digest = sha256(_resp.content).hexdigest()
+        not_modified = digest == entry.get('hash')
+        if not_modified:
+            logger.info('%s is not modified (same hash).', url)
+        self._pending[url] = dict(
+            etag=_resp.headers.get('ETag'),
+            last_modified=_resp.headers.get('Last-Modified'),
+            content_type=_resp.headers.get('Content-Type', ''),
+            hash=digest,
+            atime=time.time(),
+        ), _resp.content
+        return CachedResponse(_resp.url, _resp.content, _resp.headers, not_modified=not_modified)
+
+    def commit(self, url):
+        """将 url 最近一次 fetch 的结果写入缓存"""
+        pending = self._pending.pop(url, None)
+        if pending is None:
+            return
+        entry, content = pending
+        with self._lock:
+            if content is not None:
+                body = gzip.compress(content, compresslevel=5)
+                self._body_file(url).parent.mkdir(parents=True, exist_ok=True)
+                self._body_file(url).write_bytes(body)
+                entry['size'] = len(body)
+            self._index[url] = {**self._index.get(url, {}), **entry}
+            self._evict()
+            self._save()
+
+    def _evict(self):
+        """按最久未使用淘汰，直到总大小不超过 max_bytes"""
+        total = sum(e.get('size', 0) for e in self._index.values())
+        for url in sorted(self._index, key=lambda u: self._index[u].get('atime', 0)):
+            if total <= self.max_bytes:
+                break
+            total -= self._index.pop(url).get('size', 0)
+            self._body_file(url).unlink(missing_ok=True)
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        _tmp = self._index_file.with_suffix('.tmp')
+        _tmp.write_text(json.dumps(self._index, ensure_ascii=False), encoding='utf8')
+        _tmp.replace(self._index_file)
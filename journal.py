@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+load_text 的工作日志，每个配置一个 SQLite 文件。
+
+记录每个 page 的状态(fetched / uploaded / failed)、失败次数与下一次重试时间：
+- 已抓取但没有上传成功的正文保存在日志中，下一次运行直接上传，不再打开浏览器；
+- 连续失败的链接按指数退避跳过，直到退避时间到期。
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+__all__ = ['WorkJournal']
+
+
+class WorkJournal:
+    """一个配置的工作日志
+
+    :param retry_base: 第一次失败后的退避秒数，之后每次失败翻倍
+    :param retry_max: 最长退避秒数
+    :param keep_days: uploaded 与 failed 记录保留的天数
+    """
+
+    def __init__(self, path: Path, retry_base=3600, retry_max=7 * 24 * 3600, keep_days=30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id TEXT PRIMARY KEY, link TEXT, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+                next_retry REAL NOT NULL DEFAULT 0, error TEXT, body BLOB, updated REAL NOT NULL
+            );
+        ''')
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM pages WHERE state != ? AND updated < ?',
+                             ('fetched', time.time() - keep_days * 24 * 3600))
+
+    def _set(self, page_id, link, state, attempts=0, next_retry=0.0, error=None, body=None):
+        with self._lock, self._db:  # 逐条提交，进程中断时不丢失已完成的工作
+            self._db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             (page_id, link, state, attempts, next_retry, error, body, time.time()))
+
+    def due(self, items: Iterable[dict]) -> Iterator[dict]:
+        """过滤掉退避时间未到期的 page，items 为拥有 page_id 与 link 的 dict"""
+        now = time.time()
+        for item in items:
+            with self._lock:
+                row = self._db.execute('SELECT state, next_retry FROM pages WHERE page_id = ?',
+                                       (item['page_id'],)).fetchone()
+            if row and row[0] == 'failed' and row[1] > now:
+                continue
+            yield item
+
+    def skipped(self) -> int:
+        """退避中的 page 数"""
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM pages WHERE state = ? AND next_retry > ?',
+                                    ('failed', time.time())).fetchone()[0]
+
+    def fetched_body(self, page_id) -> Optional[dict]:
+        """上一次运行已抓取但未上传的 body"""
+        with self._lock:
+            row = self._db.execute('SELECT body FROM pages WHERE page_id = ? AND state = ?',
+                                   (page_id, 'fetched')).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row and row[0] else None
+
+    def fetched(self, page_id, link, body: dict):
+        self._set(page_id, link, 'fetched', body=zlib.compress(json.dumps(body, ensure_ascii=False).encode()))
+
+    def uploaded(self, page_id):
+        with self._lock, self._db:
+            self._db.execute('UPDATE pages SET state = ?, attempts = 0, body = NULL, updated = ? WHERE page_id = ?',
+                             ('uploaded', time.time(), page_id))
+
+    def failed(self, page_id, link, error) -> float:
+        """记录一次失败，返回下一次重试的时间戳"""
+        with self._lock:
+            row = self._db.execute('SELECT attempts FROM pages WHERE page_id = ? AND state = ?',
+                                   (page_id, 'failed')).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        next_retry = time.time() + min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        self._set(page_id, link, 'failed', attempts, next_retry, str(error)[:500])
+        return next_retry
+
+    def close(self):
+        with self._lock:
+            self._db.close()
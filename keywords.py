@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+关键词提取：
+    按 lang.detect_lang 的结果路由：中文使用 jieba 的 TF-IDF，jieba 词典缓存与 IDF 表序列化到本地目录，加载只需反序列化；
+    英文等拉丁文字使用本模块的 TF-IDF，IDF 表从抓取到的正文中累积；
+    可选进程池，批量提取时不受 GIL 限制。
+"""
+import atexit
+import json
+import logging
+import math
+import pickle
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List
+
+import metrics
+from lang import classify, detect_lang
+
+if TYPE_CHECKING:  # jieba 在第一篇中文正文时导入
+    from jieba.analyse.tfidf import TFIDF
+
+__all__ = ['KeywordEngine', 'EnglishTFIDF']
+
+logger = logging.getLogger('dsa.spider.keywords')
+
+_LATIN_WORD = re.compile(r"[A-Za-z][A-Za-z'\-]{2,}")
+
+EN_STOP_WORDS = frozenset('''
+a about above after again against all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her here
+hers herself him himself his how however i if in into is it its itself just may me might more most must my
+myself no nor not now of off on once only or other our ours ourselves out over own same shall she should so
+some such than that the their theirs them themselves then there these they this those through to too under
+until up upon very was we were what when where which while who whom why will with within without would you
+your yours yourself yourselves said says one two new news also page pages read more click here www http https
+com org html january february march april may june july august september october november december
+'''.split())
+
+
+def _load_zh(cache_dir: Path) -> 'TFIDF':
+    """导入 jieba 并加载词典与 IDF 表，均使用 cache_dir 中的缓存"""
+    import jieba
+    import jieba.posseg
+    from jieba.analyse.tfidf import TFIDF, IDFLoader, DEFAULT_IDF
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    jieba.dt.tmp_dir = str(cache_dir)  # jieba 将前缀词典 marshal 到 tmp_dir/jieba.cache
+    jieba.dt.initialize()
+
+    idf_cache = cache_dir.joinpath('idf_zh.pkl')
+    extractor = TFIDF.__new__(TFIDF)  # 跳过 TFIDF.__init__ 中对 idf.txt 的逐行解析
+    extractor.tokenizer = jieba.dt
+    extractor.postokenizer = jieba.posseg.dt
+    extractor.stop_words = TFIDF.STOP_WORDS.copy()
+    extractor.idf_loader = IDFLoader()
+    try:
+        extractor.idf_freq, extractor.median_idf = pickle.loads(idf_cache.read_bytes())
+    except (OSError, pickle.UnpicklingError, ValueError, EOFError):
+        extractor.idf_loader.set_new_path(DEFAULT_IDF)
+        extractor.idf_freq, extractor.median_idf = extractor.idf_loader.get_idf()
+        idf_cache.write_bytes(pickle.dumps((extractor.idf_freq, extractor.median_idf), pickle.HIGHEST_PROTOCOL))
+    return extractor
+
+
+class EnglishTFIDF:
+    """拉丁文字的 TF-IDF，文档频率从处理过的正文中累积并持久化"""
+
+    MAX_TERMS = 200_000  # 超过时淘汰只出现过一次的词
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 写入临时文件与替换，不阻塞提取
+        self.docs, self.df = 0, None  # 第一次提取时加载
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding='utf8'))
+            self.docs, self.df = data['docs'], Counter(data['df'])
+        except (OSError, ValueError, KeyError):
+            self.docs, self.df = 0, Counter()
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return [w for w in (m.group().lower().strip("'-") for m in _LATIN_WORD.finditer(text))
+                if len(w) > 2 and w not in EN_STOP_WORDS]
+
+    def extract(self, text: str, topk=10) -> List[str]:
+        tf = Counter(self.tokenize(text))
+        if not tf:
+            return []
+        with self._lock:
+            if self.df is None:
+                self._load()
+            self.docs += 1
+            self.df.update(tf.keys())
+            docs = self.docs
+            scores = {w: c * (math.log((docs + 1) / (self.df[w] + 1)) + 1) for w, c in tf.items()}
+        return [w for w, _ in sorted(scores.items(), key=lambda i: i[1], reverse=True)[:topk]]
+
+    def save(self):
+        """同时只有一个线程保存：共用的临时文件不会被交错写入，较早的快照也不会覆盖较新的"""
+        with self._save_lock:
+            with self._lock:
+                if self.df is None:  # 没有使用过，不覆盖已保存的文档频率
+                    return
+                if len(self.df) > self.MAX_TERMS:
+                    self.df = Counter({w: c for w, c in self.df.items() if c > 1})
+                data = json.dumps({'docs': self.docs, 'df': self.df}, ensure_ascii=False)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            _tmp = self.path.with_suffix('.tmp')
+            _tmp.write_text(data, encoding='utf8')
+            _tmp.replace(self.path)
+
+
+_worker_zh = None
+
+
+def _init_worker(cache_dir):
+    """进程池初始化：每个进程只加载一次模型"""
+    global _worker_zh
+    _worker_zh = _load_zh(Path(cache_dir))
+
+
+def _worker_extract(text, topk):
+    return _worker_zh.extract_tags(text, topk)
+
+
+class KeywordEngine:
+    """关键词提取入口：按文字选择中文或英文的提取器
+
+    :param cache_dir: 词典、IDF 表等缓存目录
+    :param processes: 中文提取使用的进程数，0 时在当前线程中提取
+    """
+
+    def __init__(self, cache_dir: Path, processes=0):
+        self.cache_dir = Path(cache_dir)
+        self.processes = processes
+        self.english = EnglishTFIDF(self.cache_dir.joinpath('idf_en.json'))
+        self._zh = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def zh(self) -> 'TFIDF':
+        """中文提取器，首次使用时加载"""
+        with self._lock:
+            if self._zh is None:
+                self._zh = _load_zh(self.cache_dir)
+            return self._zh
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.processes, initializer=_init_worker,
+                                                 initargs=(str(self.cache_dir),))
+                atexit.register(self._pool.shutdown)
+            return self._pool
+
+    def preload(self):
+        """提前加载中文模型"""
+        self.zh
+
+    def extract(self, text: str, topk=10) -> List[str]:
+        """提取一篇正文的关键词，可在多个线程中同时调用"""
+        return self._extract(text, topk, detect_lang(text))
+
+    @metrics.timed('keywords_extract', labeler=lambda self, text, topk, lang: {'lang': lang})
+    def _extract(self, text: str, topk, lang) -> List[str]:
+        if lang == 'zh':
+            if self.processes:
+                return self.pool.submit(_worker_extract, text, topk).result()
+            return self.zh.extract_tags(text, topk)
+        return self.english.extract(text, topk)
+
+    @metrics.timed('keywords_extract_many')
+    def extract_many(self, texts: Iterable[str], topk=10) -> List[List[str]]:
+        """批量提取，中文部分在进程池中并行；load_text 按 DSA_KEYWORD_BATCH 篇调用"""
+        texts = list(texts)
+        results = [[] for _ in texts]
+        zh = [i for i, lang in enumerate(classify(texts)) if lang == 'zh']
+        zh_set = set(zh)
+        if zh and self.processes:
+            for i, _k in zip(zh, self.pool.map(_worker_extract, [texts[i] for i in zh], [topk] * len(zh),
+                                               chunksize=4)):
+                results[i] = _k
+        else:
+            for i in zh:
+                results[i] = self.zh.extract_tags(texts[i], topk)
+        for i, text in enumerate(texts):
+            if i not in zh_set:
+                results[i] = self.english.extract(text, topk)
+        return results
+
+    def save(self):
+        """保存英文 IDF 表"""
+        self.english.save()
+
+    def close(self):
+        """保存英文 IDF 表并关闭进程池"""
+        self.save()
+        if self._pool is not None:
+            self._pool.shutdown()
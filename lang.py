@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+正文的文字统计与语言路由，供关键词提取选择中文或英文的提取器。
+
+统计在 UTF-8 字节上进行：一次 bytes.translate 将汉字的首字节映射为 c、ASCII 字母映射为 l 并删除其它字节，
+结果中 c 的个数即汉字数，其余为字母数，全部在 C 中完成，不逐字符执行 Python 代码。汉字按 UTF-8 首字节 0xE4-0xE9 统计，
+即 U+4000-U+9FFF，覆盖 CJK 统一汉字。
+"""
+from typing import Iterable, List, NamedTuple
+
+__all__ = ['ScriptStats', 'script_stats', 'script_stats_many', 'detect_lang', 'classify', 'has_chinese']
+
+# 汉字在全部汉字与字母中的占比不低于该值时按中文处理
+ZH_RATIO = 0.2
+
+_CJK_LEAD = range(0xE4, 0xEA)
+_LATIN = [*range(ord('A'), ord('Z') + 1), *range(ord('a'), ord('z') + 1)]
+_SEP = 0  # 批量统计时文本之间的分隔符 \x00
+_CHUNK = 4096  # has_chinese 分块统计，达到 threshold 即返回
+
+
+def _tables(keep_sep=False):
+    table = bytearray(range(256))
+    for i in _CJK_LEAD:
+        table[i] = ord('c')
+    for i in _LATIN:
+        table[i] = ord('l')
+    keep = {*_CJK_LEAD, *_LATIN, *([_SEP] if keep_sep else [])}
+    return bytes(table), bytes(i for i in range(256) if i not in keep)
+
+
+_TABLE, _DELETE = _tables()
+_TABLE_SEP, _DELETE_SEP = _tables(keep_sep=True)
+
+
+class ScriptStats(NamedTuple):
+    length: int  # 字符数
+    cjk: int  # 汉字数
+    latin: int  # ASCII 字母数
+
+    @property
+    def cjk_ratio(self) -> float:
+        return self.cjk / self.length if self.length else 0.0
+
+    @property
+    def latin_ratio(self) -> float:
+        return self.latin / self.length if self.length else 0.0
+
+    @property
+    def lang(self) -> str:
+        """zh 或 en；汉字占汉字与字母之和的比例不低于 ZH_RATIO 时为 zh，没有汉字与字母时为 en"""
+        return _lang(self.cjk, self.cjk + self.latin)
+
+
+def _lang(cjk, letters) -> str:
+    return 'zh' if cjk and cjk >= ZH_RATIO * letters else 'en'
+
+
+def _marks(text: str, table=_TABLE, delete=_DELETE) -> bytes:
+    """只含 c(汉字) 与 l(字母) 的字节串"""
+    return text.encode('utf8', errors='surrogatepass').translate(table, delete)
+
+
+def script_stats(text: str) -> ScriptStats:
+    """统计字符数、汉字数与 ASCII 字母数"""
+    marks = _marks(text)
+    cjk = marks.count(b'c')
+    return ScriptStats(len(text), cjk, len(marks) - cjk)
+
+
+def _marks_many(texts: List[str]) -> List[bytes]:
+    """批量的 _marks，全部文本只编码与转换一次"""
+    if any('\x00' in text for text in texts):  # 文本中含有分隔符时逐个转换
+        return [_marks(text) for text in texts]
+    return _marks('\x00'.join(texts), _TABLE_SEP, _DELETE_SEP).split(b'\x00')
+
+
+def script_stats_many(texts: Iterable[str]) -> List[ScriptStats]:
+    """批量统计，适合大量短文本(如标题)"""
+    texts = list(texts)
+    result = []
+    for text, marks in zip(texts, _marks_many(texts)):
+        cjk = marks.count(b'c')
+        result.append(ScriptStats(len(text), cjk, len(marks) - cjk))
+    return result
+
+
+def detect_lang(text: str) -> str:
+    """zh 或 en，见 ScriptStats.lang"""
+    return script_stats(text).lang
+
+
+def classify(texts: Iterable[str]) -> List[str]:
+    """批量的 detect_lang"""
+    return [_lang(marks.count(b'c'), len(marks)) for marks in _marks_many(list(texts))]
+
+
+def has_chinese(text: str, threshold=1) -> bool:
+    """text 中是否至少有 threshold 个汉字，分块统计，中文正文通常在第一块即返回"""
+    cjk = 0
+    for start in range(0, len(text), _CHUNK):
+        cjk += _marks(text[start:start + _CHUNK]).count(b'c')
+        if cjk >= threshold:
+            return True
+    return threshold <= 0
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+日志目录的打包与 HTML 错误页的保存。
+
+- archive: 以快速的压缩级别将日志目录逐块写入临时文件，上传时直接从文件流式读取，不在内存中保留整个压缩包；
+- HTMLDumps: Controller 返回的 HTML 错误页只保留最新的若干个，单个文件截断到上限，避免运行中占满磁盘。
+"""
+import logging
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from typing import IO
+
+__all__ = ['HTMLDumps', 'archive']
+
+logger = logging.getLogger('dsa.spider.log-archive')
+
+# 已压缩的文件不再压缩
+_STORED_SUFFIXES = {'.gz', '.zip', '.zst', '.bz2', '.xz'}
+
+
+def archive(root: Path, compresslevel=1) -> IO[bytes]:
+    """将 root 下的全部文件(root 是文件时只有 root)打包为 zip，返回位于开头的临时文件，关闭后自动删除
+
+    zipfile 逐块读取与压缩，内存占用与日志大小无关；level 1 的压缩率与 9 相差不大，但快数倍。
+    """
+    fp = tempfile.TemporaryFile(prefix='dsa-logs-', suffix='.zip')
+    with zipfile.ZipFile(fp, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zz:
+        root = Path(root)
+        for f in [root] if root.is_file() else sorted(root.rglob('*')):
+            if not f.is_file():
+                continue
+            try:
+                zz.write(f, compress_type=zipfile.ZIP_STORED if f.suffix in _STORED_SUFFIXES else None)
+            except OSError as _e:  # 文件在打包时被删除或无权限读取
+                logger.warning('Skip %s in log archive, %s', f, _e)
+    logger.info('Log archive is %d bytes.', fp.tell())
+    fp.seek(0)
+    return fp
+
+
+class HTMLDumps:
+    """保存 HTML 错误页，只保留最新的 keep 个文件，每个文件至多 max_bytes 字节
+
+    :param root: 保存目录，随日志目录一起上传
+    """
+
+    def __init__(self, root: Path, keep=50, max_bytes=256 * 1024):
+        self.root = Path(root)
+        self.keep = keep
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def save(self, name: str, content: bytes) -> Path:
+        path = self.root.joinpath(f'{name}.html')
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content[:self.max_bytes])
+            dumps = sorted(self.root.glob('*.html'), key=lambda p: p.stat().st_mtime)
+            for old in dumps[:-self.keep]:
+                old.unlink(missing_ok=True)
+        return path
@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+非阻塞的日志管道：dictConfig 之后调用 install()，每个配置了 handler 的 logger 改为
+QueueHandler -> 队列 -> QueueListener(后台线程) -> 原有的 handler。
+
+- 记录在调用线程中只入队，格式化(getMessage)与磁盘写入都在后台线程中进行；
+- 队列满时丢弃记录并计数，爬取线程不会因为日志阻塞；
+- 高频的 INFO / DEBUG 消息按模板采样：每个模板前 burst 条全部保留，之后每 every 条保留一条；
+- handler 上的 filter(如 filter_maker)保持不变，在后台线程中执行。
+
+config_file() 将一个配置产生的记录另外写入单独的文件，worker 模式中同时处理多个配置时按配置上传日志。
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Tuple
+
+import metrics
+
+__all__ = ['TruncatingFormatter', 'sampler', 'install', 'flush', 'stop', 'config_file']
+
+logger = logging.getLogger('dsa.spider.log-queue')
+
+_installed: List[Tuple[logging.Logger, QueueHandler, QueueListener]] = []
+_samplers: List['_Sampler'] = []
+
+# 当前上下文所属的配置，记录在创建时(调用线程中)标记为 record.dsa_config
+_config: contextvars.ContextVar = contextvars.ContextVar('dsa_log_config', default=None)
+_factory_lock = threading.Lock()
+_factory_installed = False
+
+
+class TruncatingFormatter(logging.Formatter):
+    """消息超过 max_length 个字符时截断，异常堆栈不截断
+
+    在 dictConfig 中以 "()": "log_queue.TruncatingFormatter" 创建，其它键作为参数传入。
+    """
+
+    def __init__(self, fmt=None, datefmt=None, style='%', max_length=4096):
+        super().__init__(fmt, datefmt, style)
+        self.max_length = max_length
+
+    def formatMessage(self, record):
+        if len(record.message) > self.max_length:
+            record.message = f'{record.message[:self.max_length]} ...({len(record.message)} chars)'
+        return super().formatMessage(record)
+
+
+class _Sampler:
+    """按 (logger 名称, 消息模板) 计数的采样过滤器"""
+
+    def __init__(self, every=10, burst=100, level__lte='INFO'):
+        self.every = every
+        self.burst = burst
+        self.level__lte = getattr(logging, level__lte)
+        self.counts: Dict[tuple, int] = {}
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, record: logging.LogRecord):
+        if self.every <= 1 or record.levelno > self.level__lte:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            n = self.counts[key] = self.counts.get(key, 0) + 1
+            if n <= self.burst or (n - self.burst) % self.every == 0:
+                return True
+            self.suppressed += 1
+        return False
+
+
+def sampler(every=10, burst=100, level__lte='INFO') -> Callable[[logging.LogRecord], bool]:
+    """日志采样过滤器，every <= 1 时不采样"""
+    return _Sampler(every, burst, level__lte)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """入队时不格式化，消息在 QueueListener 的线程中由各 handler 格式化
+
+    标准的 QueueHandler.prepare 会在调用线程中格式化消息；日志参数应当是不再修改的值。
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('log_dropped', logger=record.name)
+
+
+def install(maxsize=10000, make_filter: Callable[[], Callable] = None):
+    """将 root 与已配置 handler 的 logger 改为经过队列写入，重复调用无效
+
+    :param maxsize: 每个队列的长度，队列满时丢弃记录
+    :param make_filter: 返回一个 QueueHandler 上的 filter，例如 lambda: sampler(10, 100)
+    """
+    if _installed:
+        return
+    loggers = [logging.getLogger()] + [_l for _l in logging.Logger.manager.loggerDict.values()
+                                       if isinstance(_l, logging.Logger)]
+    for _logger in loggers:
+        handlers = [_h for _h in _logger.handlers if not isinstance(_h, QueueHandler)]
+        if not handlers:
+            continue
+        _queue = queue.Queue(maxsize)
+        handler = _LazyQueueHandler(_queue)
+        if make_filter is not None:
+            _filter = make_filter()
+            handler.addFilter(_filter)
+            if isinstance(_filter, _Sampler):
+                _samplers.append(_filter)
+        for _h in handlers:
+            _logger.removeHandler(_h)
+        _logger.addHandler(handler)
+        listener = QueueListener(_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _installed.append((_logger, handler, listener))
+
+
+def flush(timeout=5.0):
+    """等待队列中已有的记录写入，例如打包日志之前"""
+    deadline = time.monotonic() + timeout
+    for _, _, listener in _installed:
+        while listener.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for _h in listener.handlers:
+            _h.flush()
+
+
+def stop():
+    """写入剩余的记录并停止后台线程，handler 交还给原来的 logger"""
+    suppressed = max((_s.suppressed for _s in _samplers), default=0)  # 同一条记录会经过多个 logger 的队列
+    if suppressed:
+        logger.info('Log sampling suppressed %d records.', suppressed)
+    flush()
+    for _logger, handler, listener in _installed:
+        listener.stop()
+        _logger.removeHandler(handler)
+        for _h in listener.handlers:
+            _logger.addHandler(_h)
+    _installed.clear()
+    _samplers.clear()
+
+
+def _install_factory():
+    """包装 LogRecord 工厂，以 contextvars 标记记录所属的配置；格式化在后台线程中进行，不能在那时再读取"""
+    global _factory_installed
+    with _factory_lock:
+        if _factory_installed:
+            return
+        factory = logging.getLogRecordFactory()
+
+        def _factory(*args, **kwargs):
+            record = factory(*args, **kwargs)
+            record.dsa_config = _config.get()
+            return record
+
+        logging.setLogRecordFactory(_factory)
+        _factory_installed = True
+
+
+def _attach(handler: logging.Handler):
+    """加到 root 上；已经 install 时加到 root 的 QueueListener 上，写入仍在后台线程中进行"""
+    root = logging.getLogger()
+    for _logger, _, listener in _installed:
+        if _logger is root:
+            listener.handlers = (*listener.handlers, handler)
+            return
+    root.addHandler(handler)
+
+
+def _detach(handler: logging.Handler):
+    logging.getLogger().removeHandler(handler)
+    for _, _, listener in _installed:
+        listener.handlers = tuple(_h for _h in listener.handlers if _h is not handler)
+
+
+@contextmanager
+def config_file(key: Hashable, path: Path, formatter: logging.Formatter = None, level=logging.DEBUG):
+    """在 with 块中，当前上下文产生的记录除原有的 handler 外，另外写入 path
+
+    线程池与后台线程不会自动继承 contextvars，需要以 contextvars.copy_context().run 执行
+    (scheduler.map_unordered、pipeline.threaded 与 async_engine 已经如此)，其中的记录才会计入。
+
+    :param key: 配置的标识，同时处理的配置之间不能重复
+    """
+    _install_factory()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = logging.FileHandler(path, encoding='utf8')
+    handler.setLevel(level)
+    handler.setFormatter(formatter or TruncatingFormatter('%(asctime)s %(name)s %(levelname)s - %(message)s'))
+    handler.addFilter(lambda record: getattr(record, 'dsa_config', None) == key)
+    token = _config.set(key)
+    _attach(handler)
+    try:
+        yield path
+    finally:
+        _config.reset(token)
+        flush()
+        _detach(handler)
+        handler.close()
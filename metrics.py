@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+运行指标：计时器、直方图、计数器与仪表，按名称和标签(host、endpoint 等)分组。
+
+    with timer('finds_get_text', host='example.com'):
+        ...
+
+    @timed('rss_page', labeler=lambda config, url, *args, **kwargs: {'host': host(url)})
+    def _rss_page(config, url, ...): ...
+
+summary() 的结果随 upload_status 上传；也可以导出为 Prometheus 文本格式或 JSON。
+在 scope() 中记录的指标另外计入一个独立的注册表，worker 模式中每个配置只上传自己的指标。
+"""
+import contextvars
+import cProfile
+import functools
+import json
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+try:  # 只在 Unix 上可用，Windows 上使用 psutil
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = ['registry', 'timer', 'timed', 'inc', 'gauge', 'observe', 'host', 'endpoint', 'peak_rss_mb', 'scope',
+           'ThreadProfiler']
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+_RESERVOIR = 1000  # 用于计算分位数的样本上限
+
+# 当前上下文中 scope() 创建的注册表
+_scope: contextvars.ContextVar = contextvars.ContextVar('dsa_metrics_scope', default=None)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def host(url) -> str:
+    """url 的 host，用作标签"""
+    return urlsplit(url or '').netloc or 'unknown'
+
+
+def endpoint(url: str) -> str:
+    """Controller 的接口名，用作标签：去掉查询参数，page_id、数字 ID 替换为 {id}"""
+    return re.sub(r'/[0-9a-f]{32}(?=/|$)|/\d+(?=/|$)', '/{id}', url.split('?', 1)[0])
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._samples = []
+
+    def observe(self, value):
+        for i, le in enumerate(_BUCKETS):
+            if value <= le:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        if len(self._samples) < _RESERVOIR:
+            self._samples.append(value)
+        else:  # 蓄水池抽样
+            i = random.randrange(self.count)
+            if i < _RESERVOIR:
+                self._samples[i] = value
+
+    def quantile(self, q):
+        if not self._samples:
+            return 0.0
+        samples = sorted(self._samples)
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'sum': round(self.sum, 4), 'max': round(self.max, 4),
+                'p50': round(self.quantile(0.5), 4), 'p99': round(self.quantile(0.99), 4)}
+
+
+class Metrics:
+    """进程内的指标注册表，线程安全"""
+
+    def __init__(self, prefix='dsa'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}  # (name, labels) -> int
+        self.gauges = {}  # (name, labels) -> [当前值, 峰值]
+
+    def _targets(self) -> tuple:
+        """全局注册表中记录的指标同时计入当前上下文的 scope()"""
+        scoped = _scope.get()
+        return (self, scoped) if self is registry and scoped is not None else (self,)
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        for _m in self._targets():
+            with _m._lock:
+                _m.histograms.setdefault(key, Histogram()).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        for _m in self._targets():
+            with _m._lock:
+                _m.counters[key] = _m.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """设置仪表的当前值，并记录峰值"""
+        key = (name, _label_key(labels))
+        for _m in self._targets():
+            with _m._lock:
+                current = _m.gauges.setdefault(key, [value, value])
+                current[0] = value
+                current[1] = max(current[1], value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """记录 with 块的耗时(秒)，异常时标签 error=异常类名"""
+        _start = time.perf_counter()
+        try:
+            yield
+        except BaseException as _e:
+            labels['error'] = type(_e).__name__
+            raise
+        finally:
+            self.observe(name + '_seconds', time.perf_counter() - _start, **labels)
+
+    def timed(self, name, labeler: Callable[..., dict] = None, **labels):
+        """timer 的装饰器形式
+
+        :param labeler: 以被装饰函数的参数调用，返回额外的标签，例如按 url 的 host 分组
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                _labels = dict(labels, **labeler(*args, **kwargs)) if labeler else labels
+                with self.timer(name, **_labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def summary(self) -> dict:
+        """上传到 Controller 的摘要"""
+        for name, children in (('process_peak_rss_mb', False), ('children_peak_rss_mb', True)):
+            peak = peak_rss_mb(children)
+            if peak is not None:
+                self.gauge(name, peak)
+
+        def _name(name, labels):
+            return name + (''.join(f'[{v}]' for _, v in labels) if labels else '')
+
+        with self._lock:
+            return {
+                'timers': {_name(n, l): h.summary() for (n, l), h in sorted(self.histograms.items())},
+                'counters': {_name(n, l): v for (n, l), v in sorted(self.counters.items())},
+                'gauges': {_name(n, l): {'value': round(v[0], 2), 'peak': round(v[1], 2)}
+                           for (n, l), v in sorted(self.gauges.items())},
+            }
+
+    def prometheus(self) -> str:
+        """Prometheus 文本格式"""
+
+        def _labels(labels, **extra):
+            items = [*labels, *extra.items()]
+            return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}' if items else ''
+
+        lines = []
+        with self._lock:
+            for (name, labels), h in sorted(self.histograms.items()):
+                metric = f'{self.prefix}_{name}'
+                lines.append(f'# TYPE {metric} histogram')
+                cumulative = 0
+                for le, n in zip(_BUCKETS, h.buckets):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{_labels(labels, le="+Inf" if le == float("inf") else le)} '
+                                 f'{cumulative}')
+                lines.append(f'{metric}_sum{_labels(labels)} {h.sum}')
+                lines.append(f'{metric}_count{_labels(labels)} {h.count}')
+            for (name, labels), v in sorted(self.counters.items()):
+                lines.append(f'# TYPE {self.prefix}_{name} counter')
+                lines.append(f'{self.prefix}_{name}{_labels(labels)} {v}')
+            for (name, labels), v in sorted(self.gauges.items()):
+                lines.append(f'# TYPE {self.prefix}_{name} gauge')
+                lines.append(f'{self.prefix}_{name}{_labels(labels)} {v[0]}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """按后缀导出，.prom 为 Prometheus 文本格式，其它为 JSON"""
+        path = Path(path)
+        if path.suffix == '.prom':
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.summary(), indent=2, ensure_ascii=False)
+        path.write_text(text, encoding='utf8')
+
+
+class ThreadProfiler:
+    """对所有线程生效的 cProfile，结果合并为一个 pstats 文件，可用 snakeviz / flameprof 查看"""
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def _thread_start(self, *args):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        threading.setprofile(self._thread_start)
+        self._thread_start()
+
+    def dump(self, path):
+        threading.setprofile(None)
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+def peak_rss_mb(children=False) -> Optional[float]:
+    """本进程(或已结束的子进程中最大的)常驻内存峰值 MB，无法获取时返回 None
+
+    Unix 使用 getrusage，ru_maxrss 在 macOS 上以字节为单位、其它系统为 KB；
+    Windows 使用 psutil 的 peak_wset，不统计子进程。
+    """
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 1024 / 1024 if sys.platform == 'darwin' else maxrss / 1024
+    if children:
+        return None
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+@contextmanager
+def scope():
+    """在 with 块中(以及继承了 contextvars 的线程与协程中)记录的指标另外计入一个新的注册表，并返回该注册表"""
+    scoped = Metrics(registry.prefix)
+    token = _scope.set(scoped)
+    try:
+        yield scoped
+    finally:
+        _scope.reset(token)
+
+
+registry = Metrics()
+timer = registry.timer
+timed = registry.timed
+inc = registry.inc
+gauge = registry.gauge
+observe = registry.observe
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+流水线：在后台线程中运行一个阶段(迭代器)，通过有界队列交给下游，
+队列满时上游阻塞(背压)，内存占用与数据总量无关。
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, List
+
+__all__ = ['threaded', 'batched']
+
+logger = logging.getLogger('dsa.spider.pipeline')
+
+_DONE = object()
+
+
+class _Error:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def threaded(iterable: Iterable, maxsize=64, tick: float = None, name='dsa-stage') -> Iterator:
+    """在后台线程中迭代 iterable，按顺序产出其结果；上游的异常在下游重新抛出
+
+    :param maxsize: 队列长度，上游最多领先下游 maxsize 个元素
+    :param tick: 超过 tick 秒没有新元素时产出 None，下游可以据此按时间刷新批次
+    """
+    _queue = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                _queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run():
+        try:
+            for item in iterable:
+                if not _put(item):
+                    return  # 下游已经停止
+            _put(_DONE)
+        except BaseException as _e:
+            _put(_Error(_e))
+
+    # 上游在调用方的 contextvars 中运行，日志仍计入所属的配置
+    threading.Thread(target=contextvars.copy_context().run, args=(_run,), name=name, daemon=True).start()
+    try:
+        while True:
+            try:
+                item = _queue.get(timeout=tick)
+            except queue.Empty:
+                yield None
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Error):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(items: Iterable, batch_size, max_wait) -> Iterator[List]:
+    """按数量或等待时间将 items 切分为批次，items 中的 None 视为空闲心跳(见 threaded 的 tick)，只用于按时间刷新"""
+    batch, since = [], time.monotonic()
+    for item in items:
+        if item is not None:
+            if not batch:
+                since = time.monotonic()
+            batch.append(item)
+        if batch and (len(batch) >= batch_size or time.monotonic() - since >= max_wait):
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+站点请求的录制与回放。
+
+record: 静态抓取的列表页、正文页、Feed 以及浏览器渲染后的 page_source 保存到本地存档；
+replay: 只从存档中读取，不访问站点也不启动浏览器，create / load_text 以磁盘速度运行，
+        用于修改选择器或提取逻辑后重新提取，以及可重复的离线性能测试。
+
+存档按内容寻址：正文以 sha256 命名、zlib 压缩保存在 objects/ 中，相同的内容只保存一份；
+SQLite 索引记录 (url, 类型, 抓取时间) -> 内容，回放时取指定时间之前的最新记录。
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from hashlib import sha256
+from http import HTTPStatus
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import metrics
+
+__all__ = ['FetchArchive', 'Record', 'NotRecorded']
+
+logger = logging.getLogger('dsa.spider.replay')
+
+_CHARSET = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+_CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+
+class NotRecorded(LookupError):
+    """回放时存档中没有该 URL"""
+
+
+class Record(NamedTuple):
+    url: str
+    kind: str  # http: 站点的响应；browser: 浏览器渲染后的 page_source
+    fetched: float
+    status: int
+    final_url: str
+    content_type: str
+    location: Optional[str]  # 重定向的目标
+    content: bytes
+
+    @property
+    def charset(self) -> Optional[str]:
+        m = _CHARSET.search(self.content_type or '')
+        return m.group(1) if m else None
+
+
+class FetchArchive:
+    """录制与回放站点请求的存档
+
+    :param mode: record 或 replay
+    :param at: 回放该时间戳及之前的最新记录，None 为最新
+    """
+
+    def __init__(self, root: Path, mode='record', at: float = None):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f'Unknown archive mode: {mode}')
+        self.root = Path(root)
+        self.mode = mode
+        self.at = at
+        self.objects = self.root.joinpath('objects')
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.root.joinpath('index.sqlite'), check_same_thread=False)
+        self._db.executescript('''
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS records (
+                url TEXT NOT NULL, kind TEXT NOT NULL, fetched REAL NOT NULL, status INTEGER NOT NULL,
+                final_url TEXT, content_type TEXT, location TEXT, digest TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_url ON records (url, kind, fetched);
+        ''')
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def _object(self, digest) -> Path:
+        return self.objects.joinpath(digest[:2], digest[2:] + '.z')
+
+    def put(self, url, content: Union[str, bytes], kind='http', status=200, final_url=None,
+            content_type='', location=None):
+        """保存一次抓取的结果，str 以 UTF-8 编码保存"""
+        if isinstance(content, str):
+            content = content.encode('utf8')
+            content_type = content_type or 'text/html; charset=utf-8'
+        digest = sha256(content).hexdigest()
+        path = self._object(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            _tmp = path.with_suffix(f'.{threading.get_ident()}.tmp')
+            _tmp.write_bytes(zlib.compress(content, 6))
+            _tmp.replace(path)
+        with self._lock, self._db:
+            self._db.execute('INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             (url, kind, time.time(), status, final_url or url, content_type, location, digest))
+
+    def get(self, url, kind='http') -> Optional[Record]:
+        """url 在 at 之前最新的记录，没有时返回 None"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT url, kind, fetched, status, final_url, content_type, location, digest FROM records '
+                'WHERE url = ? AND kind = ? AND fetched <= ? ORDER BY fetched DESC LIMIT 1',
+                (url, kind, self.at or float('inf'))).fetchone()
+        if row is None:
+            return None
+        return Record(*row[:-1], zlib.decompress(self._object(row[-1]).read_bytes()))
+
+    def resolve(self, url, kind='http', max_redirects=10) -> Record:
+        """跟随存档中的重定向，返回最终的记录，没有时抛出 NotRecorded"""
+        for _ in range(max_redirects + 1):
+            record = self.get(url, kind)
+            if record is None:
+                metrics.inc('replay_misses', kind=kind)
+                raise NotRecorded(url)
+            if not record.location:
+                return record
+            url = requests.compat.urljoin(url, record.location)
+        raise NotRecorded(f'Too many redirects: {url}')
+
+    def page_source(self, url) -> str:
+        """回放浏览器渲染后的 page_source"""
+        record = self.resolve(url, 'browser')
+        return record.content.decode(record.charset or 'utf8', errors='replace')
+
+    def install(self, session: requests.Session):
+        """在 session 的全部 adapter 外包装一层录制 / 回放"""
+        for prefix, adapter in list(session.adapters.items()):
+            session.mount(prefix, _ArchiveAdapter(self, adapter))
+        logger.info('Site requests are in %s mode, archive: %s', self.mode, self.root)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class _ArchiveAdapter(BaseAdapter):
+    """录制时转发给原来的 adapter 并保存 GET 的响应；回放时由存档构造响应，不发出请求"""
+
+    def __init__(self, archive: FetchArchive, adapter: BaseAdapter):
+        super().__init__()
+        self.archive = archive
+        self.adapter = adapter
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if request.method != 'GET':
+            return self.adapter.send(request, **kwargs)
+        if self.archive.replaying:
+            return self._replay(request)
+
+        if self.archive.get(request.url) is None:  # 第一次录制时不发送条件请求，避免 304 没有正文
+            for header in _CONDITIONAL_HEADERS:
+                request.headers.pop(header, None)
+        resp = self.adapter.send(request, **kwargs)
+        if resp.status_code < 300 or resp.is_redirect:
+            self.archive.put(request.url, resp.content, status=resp.status_code, final_url=resp.url,
+                             content_type=resp.headers.get('Content-Type', ''), location=resp.headers.get('Location'))
+        return resp
+
+    def _replay(self, request: requests.PreparedRequest) -> requests.Response:
+        record = self.archive.get(request.url)
+        if record is None:
+            metrics.inc('replay_misses', kind='http')
+            raise requests.ConnectionError(f'{request.url} is not recorded', request=request)
+        resp = requests.Response()
+        resp.status_code = record.status
+        resp.reason = HTTPStatus(record.status).phrase
+        resp.headers = CaseInsensitiveDict({'Content-Type': record.content_type})
+        if record.location:
+            resp.headers['Location'] = record.location
+        resp._content, resp._content_consumed = record.content, True
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.url = record.final_url
+        resp.request = request
+        return resp
+
+    def close(self):
+        self.adapter.close()
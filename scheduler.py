@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+并发调度：线程池执行任务，并按域名限制并发数和每秒请求数，避免被目标站点封禁；
+以及按每个配置观察到的更新频率安排下一次抓取。
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+__all__ = ['RateLimiter', 'HostLimiter', 'map_unordered', 'UpdateSchedule']
+
+logger = logging.getLogger('dsa.spider.scheduler')
+
+
+class RateLimiter:
+    """每秒至多 rps 次，请求之间均匀间隔；rps <= 0 不限制"""
+
+    def __init__(self, rps: float):
+        self.interval = 1 / rps if rps > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """等待到下一个可用的时间点"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+class HostLimiter:
+    """按域名的礼貌限制：每个域名至多 concurrency 个并发，每秒至多 rps 个请求"""
+
+    def __init__(self, concurrency=2, rps=1.0):
+        self.concurrency = concurrency
+        self.rps = rps
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _get(self, host) -> Tuple[threading.Semaphore, RateLimiter]:
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.Semaphore(self.concurrency), RateLimiter(self.rps)
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, url):
+        """占用 url 所在域名的一个并发名额，并遵守速率限制"""
+        sem, rate = self._get(urlsplit(url).netloc)
+        with sem:
+            rate.wait()
+            yield
+
+
+def map_unordered(func: Callable, items: Iterable, workers=8) -> Iterator[Tuple[object, object, BaseException]]:
+    """以 workers 个线程执行 func(item)，按完成顺序产出 (item, result, exception)
+
+    同时在途的任务数不超过 workers * 2，items 可以是一个很长的迭代器；任务在调用方的 contextvars 中执行。
+    """
+    items = iter(items)
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dsa-worker') as pool:
+        running = {}
+
+        def _fill():
+            for item in items:
+                running[pool.submit(context.copy().run, func, item)] = item
+                if len(running) >= workers * 2:
+                    break
+
+        _fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                _e = future.exception()
+                yield item, (None if _e else future.result()), _e
+            _fill()
+
+
+class UpdateSchedule:
+    """按配置的更新频率安排下一次抓取
+
+    每次成功运行后，以本次新页面数 / 距上一次运行的小时数更新到达速率的指数移动平均(页/小时)，
+    下一次运行安排在预计出现 target 个新页面时，间隔限制在 [min_hours, max_hours] 之间；
+    从未出现新页面时间隔逐次加倍。第一次运行的新页面包含历史积压，不计入速率。
+
+    :param path: 状态文件，随 .cache 在多次运行之间保存
+    :param alpha: 指数移动平均中本次观察的权重
+    :param slack: 距离到期不足 slack * 间隔 时也视为到期，避免恰好错过一次定时运行
+    """
+
+    def __init__(self, path: Path, target=3, min_hours=1.0, max_hours=168.0, alpha=0.3, slack=0.1):
+        self.path = Path(path)
+        self.target = target
+        self.min_hours = min_hours
+        self.max_hours = max_hours
+        self.alpha = alpha
+        self.slack = slack
+        self._lock = threading.Lock()
+        try:
+            self._entries: dict = json.loads(self.path.read_text(encoding='utf8'))
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def next_due(self, config_id) -> Optional[float]:
+        """下一次到期的时间戳，没有记录时返回 None"""
+        entry = self._entries.get(str(config_id))
+        return entry['next_due'] if entry else None
+
+    def due(self, config_id, now=None) -> bool:
+        entry = self._entries.get(str(config_id))
+        if entry is None:
+            return True
+        now = time.time() if now is None else now
+        return now >= entry['next_due'] - self.slack * entry['interval'] * 3600
+
+    def record(self, config_id, new_pages: int, now=None) -> float:
+        """记录一次成功运行的新页面数，返回下一次到期的时间戳"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(str(config_id))
+            if entry is None:
+                rate, interval = None, self.min_hours
+            else:
+                hours = max((now - entry['last_run']) / 3600, 1 / 60)
+                observed = new_pages / hours
+                rate = observed if entry['rate'] is None else self.alpha * observed + (1 - self.alpha) * entry['rate']
+                interval = self.target / rate if rate > 0 else entry['interval'] * 2
+            interval = min(max(interval, self.min_hours), self.max_hours)
+            self._entries[str(config_id)] = entry = {
+                'last_run': now, 'new_pages': new_pages, 'rate': rate, 'interval': interval,
+                'next_due': now + interval * 3600,
+            }
+            self._save()
+        logger.info('Config %s: %d new pages, rate %s/h, next run in %.1fh.', config_id, new_pages,
+                    'unknown' if rate is None else f'{rate:.3f}', interval)
+        return entry['next_due']
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        _tmp = self.path.with_suffix('.tmp')
+        _tmp.write_text(json.dumps(self._entries, ensure_ascii=False), encoding='utf8')
+        _tmp.replace(self.path)
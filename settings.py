@@ -1,21 +1,73 @@
 import os
-import sys
 from pathlib import Path
 
 import dotenv
 
+import html_static
 from dsa_api import DSAClient
+from extract import TextExtractor
+from http_cache import HTTPCache
+from keywords import KeywordEngine
+from replay import FetchArchive
+from scheduler import UpdateSchedule
 
 dotenv.load_dotenv(Path(__file__).parent.joinpath('.env'))
 
-__all__ = ['dsa_client', 'DSA_CONFIG', 'DSA_HTTP', 'DSA_AUTH', 'DSA_DEBUG']
+__all__ = ['dsa_client', 'http_cache', 'keyword_engine', 'text_extractor', 'fetch_archive', 'update_schedule', 'DSA_CONFIG', 'DSA_HTTP', 'DSA_AUTH', 'DSA_DEBUG',
+           'DSA_BROWSERS', 'DSA_BROWSER_MAX_PAGES', 'DSA_BROWSER_MAX_RSS',
+           'DSA_WORKERS', 'DSA_HOST_CONCURRENCY', 'DSA_HOST_RPS', 'DSA_WORKER_CONCURRENCY',
+           'DSA_CACHE_DIR', 'DSA_PIPELINE_QUEUE', 'DSA_KEYWORD_PROCESSES', 'DSA_KEYWORD_BATCH',
+           'DSA_HTTP_TIMEOUT', 'DSA_HTTP_RETRIES', 'DSA_HTTP_POOL', 'DSA_ENGINE', 'DSA_ASYNC_CONCURRENCY',
+           'DSA_HTML_DUMPS', 'DSA_HTML_DUMP_KB', 'DSA_LOG_MODE', 'DSA_LOG_QUEUE', 'DSA_LOG_SAMPLE_EVERY',
+           'DSA_LOG_SAMPLE_BURST', 'DSA_REPLAY', 'DSA_REPLAY_DIR', 'DSA_REPLAY_AT',
+           'DSA_SCHEDULE', 'DSA_SCHEDULE_TARGET', 'DSA_SCHEDULE_MIN_HOURS', 'DSA_SCHEDULE_MAX_HOURS']
 
 DSA_HTTP = os.getenv('IN_DSA_HTTP') or os.getenv('ENV_DSA_HTTP') or os.getenv('DSA_HTTP') or 'http://localhost:8000'
 DSA_AUTH = os.getenv('IN_DSA_AUTH') or os.getenv('ENV_DSA_AUTH') or os.getenv('DSA_AUTH') or ''
 DSA_CONFIG = os.getenv('DSA_CONFIG')
 DSA_DEBUG = os.getenv('DSA_DEBUG', '') == 'true'
+DSA_LOG_MODE = os.getenv('DSA_LOG_MODE') or 'queue'  # 日志写入方式：queue 在后台线程写入，sync 在调用线程写入
+DSA_LOG_QUEUE = int(os.getenv('DSA_LOG_QUEUE') or 10000)  # 日志队列长度，队列满时丢弃记录
+DSA_LOG_SAMPLE_EVERY = int(os.getenv('DSA_LOG_SAMPLE_EVERY') or 10)  # 高频 INFO / DEBUG 日志每多少条保留一条，1 不采样
+DSA_LOG_SAMPLE_BURST = int(os.getenv('DSA_LOG_SAMPLE_BURST') or 100)  # 每种日志开始采样之前全部保留的条数
+DSA_HTTP_TIMEOUT = float(os.getenv('DSA_HTTP_TIMEOUT') or 30)  # Controller 请求的读取超时(秒)，连接超时固定为 5 秒
+DSA_HTTP_RETRIES = int(os.getenv('DSA_HTTP_RETRIES') or 4)  # Controller 请求瞬时错误的重试次数
+DSA_HTTP_POOL = int(os.getenv('DSA_HTTP_POOL') or 16)  # Controller 长连接池大小
+DSA_HTML_DUMPS = int(os.getenv('DSA_HTML_DUMPS') or 50)  # logs/html 中保留的 HTML 错误页数量
+DSA_HTML_DUMP_KB = int(os.getenv('DSA_HTML_DUMP_KB') or 256)  # 单个 HTML 错误页的大小上限 KB
 
-if len(sys.argv) >= 2:
-    DSA_CONFIG = sys.argv[1]
+DSA_BROWSERS = int(os.getenv('DSA_BROWSERS') or 2)  # 浏览器池大小
+DSA_BROWSER_MAX_PAGES = int(os.getenv('DSA_BROWSER_MAX_PAGES') or 50)  # 单个浏览器加载多少页后回收
+DSA_BROWSER_MAX_RSS = int(os.getenv('DSA_BROWSER_MAX_RSS') or 1024)  # 单个浏览器内存上限 MB
 
-dsa_client = DSAClient(DSA_HTTP, DSA_AUTH)
+DSA_WORKERS = int(os.getenv('DSA_WORKERS') or 8)  # load_text 并发线程数
+DSA_HOST_CONCURRENCY = int(os.getenv('DSA_HOST_CONCURRENCY') or 2)  # 同一域名的并发数
+DSA_HOST_RPS = float(os.getenv('DSA_HOST_RPS') or 2)  # 同一域名每秒请求数
+DSA_WORKER_CONCURRENCY = int(os.getenv('DSA_WORKER_CONCURRENCY') or 2)  # --worker 模式下同时处理的配置数
+DSA_PIPELINE_QUEUE = int(os.getenv('DSA_PIPELINE_QUEUE') or 200)  # 抓取与上传之间的队列长度
+DSA_ENGINE = os.getenv('DSA_ENGINE') or 'thread'  # load_text 的引擎：thread 或 async(需要 aiohttp)
+DSA_ASYNC_CONCURRENCY = int(os.getenv('DSA_ASYNC_CONCURRENCY') or 200)  # async 引擎的站点请求并发上限
+DSA_SCHEDULE = os.getenv('DSA_SCHEDULE') or 'adaptive'  # --worker 模式的调度：adaptive 跳过未到期的配置，all 处理全部
+DSA_SCHEDULE_TARGET = float(os.getenv('DSA_SCHEDULE_TARGET') or 3)  # 预计出现多少个新页面时再次抓取
+DSA_SCHEDULE_MIN_HOURS = float(os.getenv('DSA_SCHEDULE_MIN_HOURS') or 1)  # 两次抓取的最短间隔(小时)
+DSA_SCHEDULE_MAX_HOURS = float(os.getenv('DSA_SCHEDULE_MAX_HOURS') or 168)  # 两次抓取的最长间隔(小时)
+
+DSA_CACHE_DIR = Path(os.getenv('DSA_CACHE_DIR') or Path(__file__).parent.joinpath('.cache'))  # 本地持久化数据
+DSA_HTTP_CACHE_MB = int(os.getenv('DSA_HTTP_CACHE_MB') or 64)  # 列表页/RSS 响应缓存上限 MB
+DSA_KEYWORD_PROCESSES = int(os.getenv('DSA_KEYWORD_PROCESSES') or 0)  # 中文关键词提取的进程数，0 不使用进程池
+DSA_KEYWORD_BATCH = int(os.getenv('DSA_KEYWORD_BATCH') or 16)  # load_text 中批量提取关键词的正文数
+DSA_REPLAY = os.getenv('DSA_REPLAY') or ''  # 站点请求的录制与回放：record 保存原始页面，replay 只从存档读取
+DSA_REPLAY_DIR = Path(os.getenv('DSA_REPLAY_DIR') or DSA_CACHE_DIR.joinpath('replay'))  # 录制的存档目录
+DSA_REPLAY_AT = float(os.getenv('DSA_REPLAY_AT') or 0)  # 回放该时间戳(秒)及之前的最新记录，0 为最新
+
+dsa_client = DSAClient(DSA_HTTP, DSA_AUTH, cache_dir=DSA_CACHE_DIR,
+                       timeout=(5, DSA_HTTP_TIMEOUT), retries=DSA_HTTP_RETRIES, pool_size=DSA_HTTP_POOL,
+                       html_dumps=DSA_HTML_DUMPS, html_dump_kb=DSA_HTML_DUMP_KB)
+http_cache = HTTPCache(DSA_CACHE_DIR.joinpath('http'), DSA_HTTP_CACHE_MB * 1024 * 1024)
+keyword_engine = KeywordEngine(DSA_CACHE_DIR.joinpath('keywords'), processes=DSA_KEYWORD_PROCESSES)
+text_extractor = TextExtractor(DSA_CACHE_DIR.joinpath('pages'))
+fetch_archive = FetchArchive(DSA_REPLAY_DIR, DSA_REPLAY, DSA_REPLAY_AT or None) if DSA_REPLAY else None
+if fetch_archive is not None:
+    fetch_archive.install(html_static.session)
+update_schedule = UpdateSchedule(DSA_CACHE_DIR.joinpath('schedule.json'), DSA_SCHEDULE_TARGET,
+                                 DSA_SCHEDULE_MIN_HOURS, DSA_SCHEDULE_MAX_HOURS)
@@ -1,15 +1,31 @@
 # coding: utf8
+import contextlib
+import functools
 import json
 import sys
 import logging
-from typing import List
+import time
+from collections import namedtuple
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from selenium.webdriver.common.by import By
-import jieba.analyse as ana
-import feedparser
+import requests
 
-from chrome import chrome
-from settings import dsa_client
+import html_static
+import lang
+import metrics
+from dsa_api import DSAClient
+from fingerprint import FingerprintIndex, fingerprint
+from http_cache import NotModified
+from journal import WorkJournal
+from common import local_time
+from pipeline import batched, threaded
+from scheduler import HostLimiter, map_unordered
+from settings import (dsa_client, http_cache, keyword_engine, text_extractor, fetch_archive,
+                      DSA_BROWSERS, DSA_BROWSER_MAX_PAGES, DSA_BROWSER_MAX_RSS, DSA_WORKERS, DSA_HOST_CONCURRENCY, DSA_HOST_RPS, DSA_PIPELINE_QUEUE, DSA_CACHE_DIR,
+                      DSA_KEYWORD_BATCH)
+
+if TYPE_CHECKING:  # selenium 与 feedparser 只在使用时导入，RSS 配置与没有工作的运行不加载浏览器相关模块
+    from chrome import BrowserPool
 
 logger = logging.getLogger('dsa.spider.runner')
 
@@ -23,15 +39,8 @@ def secure_filename(s: str) -> str:
 
 
 def has_chinese(s: str, threshold=1) -> bool:
-    """一个str中是否有中文"""
-    _ec = 0
-    for _c in s:
-        if '\u4e00' <= _c <= '\u9fa5':
-            if _ec < threshold - 1:
-                _ec += 1
-            else:
-                return True
-    return False
+    """一个str中是否有中文，见 lang.has_chinese"""
+    return lang.has_chinese(s, threshold)
 
 
 def load_selector(selector_value: str) -> list[str]:
@@ -46,100 +55,500 @@ def load_selector(selector_value: str) -> list[str]:
         return []
 
 
+ListPage = namedtuple('ListPage', 'index url titles next_url')
+
+# 创建失败的 page 至多在这么多次运行中阻止提交列表页缓存与回填游标，之后不再等待它
+CREATE_MAX_FAILURES = 3
+
+
+def paginate(config, fetch_page: Callable, known: Callable[[str], bool] = None,
+             start_url=None, start_index=0) -> Iterator[ListPage]:
+    """逐页抓取列表的生成器
+
+    下一页的链接依次取自 fetch_page 返回的链接(selector_next 或 Feed 的 next 链接)、
+    config['page_template'] (如 'https://example.com/news?page={page}'，第二页为 page_start，默认 2)。
+    至多抓取 config['max_pages'] (默认 5) 页；一页中的链接全部已知(known)时停止。
+
+    :param fetch_page: (url, index) -> (titles, next_links)
+    :param known: 判断链接是否已存在的函数，None 时不提前停止
+    :param start_url: 从指定的页面开始，用于回填历史
+    :param start_index: start_url 是第几页(从 0 开始)
+    """
+    template = config.get('page_template')
+    page_start = int(config.get('page_start') or 2)
+    max_pages = int(config.get('max_pages') or 5)
+
+    url, index, visited = start_url or config['link'], start_index, set()
+    for _ in range(max_pages):
+        if not url or url in visited:
+            return
+        visited.add(url)
+        titles, next_links = fetch_page(url, index)
+        next_url = next_links[0] if next_links else (template.format(page=page_start + index) if template else None)
+        # 在产出之前判断，调用方处理后链接会变为已知
+        all_known = known is not None and titles and all(known(t['link']) for t in titles)
+        yield ListPage(index, url, titles, next_url)
+
+        if not titles:
+            return
+        if all_known:
+            logger.info('All links in page %d are known, stop paginating. %s', index, url)
+            return
+        url, index = next_url, index + 1
+
+
 class Finds:
-    linux_config = dict(pic=False, headless=True, use_gpu=False)
-    windows_config = dict(pic=False, )
+    """通过 config 中配置的CSS选择器获取标题列表和正文
+
+    config['type'] 决定抓取方式：
+        html-static: 先用 requests + lxml 静态抓取，选择器没有命中时回退到浏览器；
+        html-js: 始终使用浏览器；
+        其它(html): 自动识别，先尝试静态抓取，从未命中且连续 STATIC_MISS_LIMIT 次未命中后只使用浏览器。
+    """
+    linux_config = dict(pic=False, headless=True, use_gpu=False, performance=True)
+    windows_config = dict(pic=False, performance=True)
+    STATIC_MISS_LIMIT = 3
 
-    def __init__(self, config):
+    def __init__(self, config, limiter: HostLimiter = None):
+        """:param limiter: get_text 抓取站点时遵守的域名限制，从快照中重新提取时不占用"""
         self.config = config
+        self.limiter = limiter
         self.news = config['link']
         self.selector_page_list = load_selector(config.get('selector_list') or '[]')  # selector_list可能的值是 None 和 空字符串
         self.selector_page_text = load_selector(config.get('selector_page') or '[]')  # 同上
-        self.browser = chrome(**(self.windows_config if sys.platform == 'win32' else self.linux_config))
+        self.selector_next = load_selector(config.get('selector_next') or '[]')  # 下一页链接，同上
+        self._static_hits = 0
+        self._static_misses = 0
+        self.list_not_modified = False  # 列表页是否与上一次成功处理时相同
 
-    def titles(self) -> List[dict]:
-        """获取标题列表"""
-        self.browser.get(self.news)
-        self.browser.implicitly_wait(10)
+    @property
+    def use_static(self) -> bool:
+        """是否尝试静态抓取"""
+        _type = self.config.get('type')
+        if _type == 'html-js':
+            return False
+        if _type == 'html-static':
+            return True
+        return self._static_hits > 0 or self._static_misses < self.STATIC_MISS_LIMIT
 
-        # 遍历 model.Config.selector_list 的全部值，并将内容整合到一起
-        elements = [ele for page_list in self.selector_page_list
-                    for ele in self.browser.find_elements(By.CSS_SELECTOR, page_list)
-                    ]
+    def _static_select(self, url, selectors: List[str], cached=False):
+        """静态抓取页面并执行选择器，返回 (doc, elements)，抓取失败或没有命中时 elements 为空列表
 
-        return [{'title': ele.text, 'link': ele.get_attribute('href')} for ele in elements]
+        :param cached: 通过 http_cache 发起条件请求，并记录 list_not_modified
+        """
+        if not self.use_static:
+            return None, []
+        doc = None
+        try:
+            if cached:
+                _resp = http_cache.fetch(html_static.session, url)
+                self.list_not_modified = _resp.not_modified
+            else:
+                _resp = html_static.fetch(url)
+            doc = html_static.parse(_resp)
+            elements = html_static.select(doc, selectors)
+        except Exception as _e:  # 网络错误、解析错误、选择器语法错误均回退到浏览器
+            logger.info('Static fetch %s error, %s', url, _e)
+            elements = []
+        self.count_static(url, elements)
+        return doc, elements
 
-    def get_text(self, url) -> str:
-        """从页面中检索内容，通过 config 中配置的CSS选择器。"""
-        if not self.selector_page_text:
-            logger.warning(f'{self.config.get("name")} 没有配置 selector_text 属性跳过 ...')
-            return ''
+    def count_static(self, url, hit):
+        """记录一次静态抓取是否命中(命中的元素或提取到的正文)，用于 auto 模式的判断"""
+        if hit:
+            self._static_hits += 1
+        else:
+            self._static_misses += 1
+            logger.info('Static selectors match nothing at %s, fall back to browser.', url)
+
+    @property
+    def pool(self) -> 'BrowserPool':
+        """进程内共享的浏览器池，load_text 与 create 都从这里借用浏览器；selenium 在第一次使用浏览器时导入"""
+        from chrome import get_pool
+        return get_pool(size=DSA_BROWSERS,
+                        max_pages=DSA_BROWSER_MAX_PAGES,
+                        max_rss_mb=DSA_BROWSER_MAX_RSS,
+                        cache_dir=DSA_CACHE_DIR.joinpath('chrome'),
+                        **(self.windows_config if sys.platform == 'win32' else self.linux_config))
+
+    @staticmethod
+    def _wait_for(browser, selectors: List[str], timeout):
+        """等待任意一个选择器出现，代替固定的 implicitly_wait；页面以 eager 策略加载，不等待全部资源"""
+        if not selectors:
+            return
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        try:
+            WebDriverWait(browser, timeout, poll_frequency=0.2).until(
+                lambda b: any(b.find_elements(By.CSS_SELECTOR, selector) for selector in selectors)
+            )
+        except TimeoutException:
+            logger.info('Wait for selectors timeout(%ds) at %s', timeout, browser.current_url)
+
+    @metrics.timed('finds_titles', labeler=lambda self, url, *args, **kwargs: {'host': metrics.host(url)})
+    def _list_page(self, url, index, skip_unchanged=False):
+        """抓取一页列表，返回 (titles, next_links)
+
+        :param skip_unchanged: 静态抓取的首页与上一次成功处理时相同时抛出 NotModified，
+                               浏览器渲染的页面可能由其它接口加载数据，不做判断
+        """
+        doc, elements = self._static_select(url, self.selector_page_list, cached=index == 0)
+        if elements:
+            if skip_unchanged and index == 0 and self.list_not_modified:
+                raise NotModified(url)
+            return self.static_list_page(doc, elements)
+        return self.browser_list_page(url)
+
+    def static_list_page(self, doc, elements) -> Tuple[List[dict], List[str]]:
+        """从静态抓取的列表页中取出 (titles, next_links)"""
+        titles = [{'title': html_static.element_text(ele), 'link': ele.get('href')} for ele in elements]
+        next_links = [ele.get('href') for ele in html_static.select(doc, self.selector_next)]
+        return titles, [link for link in next_links if link]
+
+    def browser_list_page(self, url) -> Tuple[List[dict], List[str]]:
+        """以浏览器渲染列表页，返回 (titles, next_links)；回放时从录制的 page_source 中静态提取"""
+        if fetch_archive is not None and fetch_archive.replaying:
+            doc = html_static.parse_html(fetch_archive.page_source(url), url)
+            return self.static_list_page(doc, html_static.select(doc, self.selector_page_list))
+
+        from selenium.webdriver.common.by import By
+        with self.pool.borrow() as browser:
+            with metrics.timer('browser_page', host=metrics.host(url)):
+                browser.get(url)
+                self._wait_for(browser, self.selector_page_list, 10)
+            if fetch_archive is not None:
+                fetch_archive.put(url, browser.page_source, kind='browser', final_url=browser.current_url)
+
+            # 遍历 model.Config.selector_list 的全部值，并将内容整合到一起
+            elements = [ele for page_list in self.selector_page_list
+                        for ele in browser.find_elements(By.CSS_SELECTOR, page_list)
+                        ]
+            titles = [{'title': ele.text, 'link': ele.get_attribute('href')} for ele in elements]
+            next_links = [ele.get_attribute('href') for selector in self.selector_next
+                          for ele in browser.find_elements(By.CSS_SELECTOR, selector)]
+            return titles, [link for link in next_links if link]
+
+    def iter_pages(self, known: Callable[[str], bool] = None, skip_unchanged=False,
+                   start_url=None, start_index=0) -> Iterator[ListPage]:
+        """逐页获取标题列表，参数见 paginate"""
+        return paginate(self.config,
+                        lambda url, index: self._list_page(url, index, skip_unchanged=skip_unchanged),
+                        known=known, start_url=start_url, start_index=start_index)
+
+    def titles(self, skip_unchanged=False, known: Callable[[str], bool] = None) -> Iterator[dict]:
+        """逐个产出标题，包括分页"""
+        for page in self.iter_pages(known=known, skip_unchanged=skip_unchanged):
+            yield from page.titles
+
+    @property
+    def text_selectors_valid(self) -> bool:
+        """selector_page 的每一项都是 str；没有配置 selector_page 时按文本密度识别正文"""
         for page_text in self.selector_page_text:
             if not isinstance(page_text, str):
                 logger.warning(f'{self.config.get("name")} 的 selector_text 中的每一项必须是一个str, \n'
                                f'但是得到 {type(page_text)}, ({page_text = }) ')
-                return ''
-        self.browser.get(url)
-        self.browser.implicitly_wait(30)
+                return False
+        return True
 
-        # 遍历 model.Config.selector_page 的全部值，并将内容整合到一起
-        elements = [ele for page_text in self.selector_page_text
-                    for ele in self.browser.find_elements(By.CSS_SELECTOR, page_text)
-                    ]
+    @metrics.timed('finds_get_text', labeler=lambda self, url: {'host': metrics.host(url)})
+    def get_text(self, url) -> str:
+        """从页面中检索内容，通过 config 中配置的CSS选择器，没有配置时按文本密度识别正文。
+
+        已保存过快照的页面(例如修改了选择器)直接从快照中重新提取，不再抓取站点。
+        """
+        if not self.text_selectors_valid:
+            return ''
+        text = text_extractor.reextract(url, self.selector_page_text)
+        if text:
+            return text
+        with self.limiter.slot(url) if self.limiter is not None else contextlib.nullcontext():
+            if self.use_static:
+                text = self.static_text(url)
+                if text:
+                    return text
+            return self.browser_text(url)
+
+    def static_text(self, url) -> str:
+        """静态抓取页面并提取正文，抓取失败或选择器没有命中时返回空字符串"""
+        try:
+            text = text_extractor.extract(url, html_static.markup(html_static.fetch(url)), self.selector_page_text)
+        except Exception as _e:  # 网络错误、解析错误、选择器语法错误均回退到浏览器
+            logger.info('Static fetch %s error, %s', url, _e)
+            text = ''
+        self.count_static(url, text)
+        return text
+
+    def browser_text(self, url) -> str:
+        """以浏览器渲染页面，从渲染后的 HTML 中提取正文；回放时使用录制的 page_source"""
+        if fetch_archive is not None and fetch_archive.replaying:
+            return text_extractor.extract(url, fetch_archive.page_source(url), self.selector_page_text)
+
+        with self.pool.borrow() as browser:
+            with metrics.timer('browser_page', host=metrics.host(url)):
+                browser.get(url)
+                self._wait_for(browser, self.selector_page_text, 30)
+            source = browser.page_source
+            if fetch_archive is not None:
+                fetch_archive.put(url, source, kind='browser', final_url=browser.current_url)
+        return text_extractor.extract(url, source, self.selector_page_text)
+
+
+@metrics.timed('rss', labeler=lambda config, url, *args, **kwargs: {'host': metrics.host(url)})
+def _rss_page(config, url, index, skip_unchanged=False):
+    """抓取一页 Feed，返回 (titles, next_links)"""
+    import feedparser
+    try:
+        _resp = http_cache.fetch(html_static.session, url) if index == 0 else html_static.fetch(url)
+    except requests.RequestException as _e:
+        logger.warning('Fetch feed %s error, %s', url, _e)
+        if fetch_archive is not None and fetch_archive.replaying:  # 没有录制，回放时不访问站点
+            raise
+        feed = feedparser.parse(url)
+    else:
+        if skip_unchanged and index == 0 and _resp.not_modified:
+            raise NotModified(url)
+        feed = feedparser.parse(_resp.content, response_headers={'content-location': _resp.url,
+                                                                 'content-type': _resp.headers.get('Content-Type', '')})
+    return feed_page(feed)
 
-        return '\n'.join(ele.text for ele in elements)
 
+def feed_page(feed) -> Tuple[List[dict], List[str]]:
+    """从 feedparser 的结果中取出 (titles, next_links)"""
+    titles = [{'title': p['title'],
+               'description': p.get('description'),
+               'link': p.get('link'),
+               'page_time': p.get('pubDate')
+               } for p in feed['entries']]
+    # RFC 5005 分页 Feed 的下一页
+    next_links = [link['href'] for link in feed['feed'].get('links', []) if link.get('rel') == 'next']
+    return titles, next_links
 
-def rss(config) -> List[dict]:
-    """RSS 配置"""
-    return [{'title': p['title'],
-             'description': p.get('description'),
-             'link': p.get('link'),
-             'page_time': p.get('pubDate')
-             } for p in feedparser.parse(config['link'])['entries']]
 
+def rss_pages(config, known: Callable[[str], bool] = None, skip_unchanged=False,
+              start_url=None, start_index=0) -> Iterator[ListPage]:
+    """逐页获取 Feed，参数见 paginate"""
+    return paginate(config,
+                    lambda url, index: _rss_page(config, url, index, skip_unchanged=skip_unchanged),
+                    known=known, start_url=start_url, start_index=start_index)
 
-def create(config):
-    """向服务器推送新的文章标题和文章链接"""
+
+def rss(config, skip_unchanged=False, known: Callable[[str], bool] = None) -> Iterator[dict]:
+    """RSS 配置，逐个产出标题
+
+    :param skip_unchanged: Feed 与上一次成功处理时相同时抛出 NotModified
+    """
+    for page in rss_pages(config, known=known, skip_unchanged=skip_unchanged):
+        yield from page.titles
+
+
+def create(config, client: DSAClient = None):
+    """向服务器推送新的文章标题和文章链接
+
+    默认从第一页开始翻页，遇到只包含已知链接的页面时停止；
+    config['backfill'] 为真时，额外从上一次回填停止的位置继续向后抓取至多 max_pages 页。
+
+    有 page 创建失败时不提交列表页的缓存，下一次运行重新抓取；回填游标前进到第一个有失败的页为止。
+    同一个 page 连续失败 CREATE_MAX_FAILURES 次后不再阻止二者。
+
+    :param client: 处理该配置的客户端，默认使用 settings.dsa_client
+    """
+    client = client or dsa_client
     if not config.get('name'):
         raise FileNotFoundError("config 中没有发现名称")
 
     if config.get('type') == 'rss':
-        titles = rss(config)
+        pages = functools.partial(rss_pages, config)
     else:
-        titles = Finds(config).titles()
+        pages = Finds(config).iter_pages
 
-    try:
-        for title in titles:
-            title['source'] = config['name']
+    backfilled = []  # 回填抓取的页，按顺序
+    # 回放用于重新提取，不因为首页与上一次相同而跳过
+    skip_unchanged = fetch_archive is None or not fetch_archive.replaying
 
-            dsa_client.page_create(
-                title
-            )
-    except Exception as _e:
-        logger.warning(_e)
-        # TODO Next Page
+    def _titles():
+        """列表抓取阶段：先翻页抓取新的标题，再按需回填历史"""
+        try:
+            for page in pages(known=lambda link: link in client.page_links, skip_unchanged=skip_unchanged):
+                yield from page.titles
+        except NotModified:
+            logger.info('%s is not modified since last run.', config['name'])
 
+        if config.get('backfill'):
+            backfill = client.dedup.meta.get('backfill') or {}
+            if not backfill.get('done'):
+                for page in pages(start_url=backfill.get('url'), start_index=backfill.get('index', 0)):
+                    backfilled.append(page)
+                    yield from page.titles
 
-def load_text(config):
-    """从controller中获取当前配置中没有text的配置信息，"""
-    for item in dsa_client.page_no_text():
-        item: dict  # 拥有2个key的dict: page_id, link
+    def _bodies():
+        for title in _titles():
+            title['source'] = config['name']
+            yield title
 
-        text = Finds(config).get_text(item['link'])
+    # 抓取在后台线程中进行，通过有界队列交给上传阶段，二者互相重叠
+    results = client.page_create_many(threaded(_bodies(), maxsize=DSA_PIPELINE_QUEUE, tick=1.0))
 
-        if has_chinese(text):
-            _k = ana.tfidf(text, 10)
-        else:
-            _k = []  # TODO English
-        logger.info('Uploading page text: %s', item['page_id'])
-        if text != '':
-            dsa_client.page_update(
-                {'page_id': item['page_id'],
-                 'keywords': _k,
-                 'text': text,
-                 }
-            )
+    failures = client.dedup.meta.setdefault('create_failures', {})  # page_id -> 连续失败的运行次数
+    for page_id, ok in results.items():
+        if ok:
+            failures.pop(page_id, None)
         else:
-            dsa_client.Cache.NOT_FOUND_TEXT_IDS.append(item['page_id'])
-            logger.error('Not Found Text in this Page. link: %s', item['link'])
+            failures[page_id] = failures.get(page_id, 0) + 1
+
+    def _blocking(title) -> bool:
+        """创建失败、且仍在重试次数之内的 page"""
+        page_id = title.get('page_id')
+        return results.get(page_id) is False and failures[page_id] < CREATE_MAX_FAILURES
+
+    failed = [page_id for page_id, ok in results.items() if not ok]
+    if failed:
+        given_up = [page_id for page_id in failed if failures[page_id] >= CREATE_MAX_FAILURES]
+        logger.warning('%d / %d pages create failed, %d of them failed %d times and will not block the next run.',
+                       len(failed), len(results), len(given_up), CREATE_MAX_FAILURES)
+
+    # 没有需要重试的失败时才记录，否则下一次运行不会跳过
+    if not any(failures[page_id] < CREATE_MAX_FAILURES for page_id in failed):
+        http_cache.commit(config['link'])
+    last_page = None
+    for page in backfilled:
+        if any(_blocking(title) for title in page.titles):
+            break
+        last_page = page
+    if last_page is not None:
+        client.dedup.meta['backfill'] = ({'url': last_page.next_url, 'index': last_page.index + 1}
+                                         if last_page.next_url else {'done': True})
+    client.dedup.flush()
+
+
+class TextLoader:
+    """load_text 中与抓取方式无关的部分：工作日志、正文指纹、关键词，以及上传结果的记录
+
+    线程模式的 load_text 与 async_engine.load_text 共用；
+    prepare 生成的 body 可能还没有关键词，由 complete 按批次提取，中文部分可以在进程池中并行。
+    """
+
+    def __init__(self, config, client: DSAClient):
+        self.client = client
+        fp_name = config.get('id') or secure_filename(config['name'])
+        self.fp_index = FingerprintIndex(DSA_CACHE_DIR.joinpath('fingerprint', f'{fp_name}.sqlite'))
+        self.journal = WorkJournal(DSA_CACHE_DIR.joinpath('journal', f'{fp_name}.sqlite'))
+        self.pending = {}  # page_id -> (指纹, 关键词)，上传成功后写入索引
+        self.links = {}  # page_id -> link，prepare 之后、complete 之前的 page
+
+    def items(self, items: Iterable[dict]) -> Iterator[dict]:
+        """需要抓取的 page，跳过退避中的链接"""
+        return self.journal.due(items)
+
+    def resumed(self, item: dict) -> Optional[dict]:
+        """上一次运行已抓取但没有上传的 body"""
+        body = self.journal.fetched_body(item['page_id'])
+        if body is not None:
+            logger.info('Resume page text from journal: %s', item['page_id'])
+            self.pending[item['page_id']] = fingerprint(body['text']), body['keywords']
+        return body
+
+    def failed(self, item: dict, exc: BaseException):
+        self.journal.failed(item['page_id'], item['link'], exc)
+
+    def prepare(self, item: dict, text: str) -> Optional[dict]:
+        """由正文生成上传的 body，不需要上传时返回 None；需要提取关键词时 body 中没有 keywords"""
+        if text == '':
+            self.client.Cache.NOT_FOUND_TEXT_IDS.append(item['page_id'])
+            next_retry = self.journal.failed(item['page_id'], item['link'], 'Not Found Text')
+            logger.error('Not Found Text in this Page. link: %s, retry after %s', item['link'], local_time(next_retry))
+            return None
+
+        body = {'page_id': item['page_id'], 'text': text}
+        fp = fingerprint(text)
+        match = self.fp_index.match(fp)
+        if match is not None and match.exact and match.page_id == item['page_id']:
+            # 索引中已有该 page，但 Controller 仍将其列为没有正文(例如上传后被清空)，复用关键词重新上传
+            logger.info('Text of page %s is in the index but not on the controller, upload again.', item['page_id'])
+            body['keywords'] = match.keywords
+        elif match is not None and match.exact:
+            logger.info('Text of page %s is the same as %s.', item['page_id'], match.page_id)
+            body.update(keywords=match.keywords, duplicate_of=match.page_id)
+        elif match is not None:
+            logger.info('Text of page %s is similar to %s, distance: %d',
+                        item['page_id'], match.page_id, match.distance)
+            body.update(near_duplicate_of=match.page_id, similarity=round(1 - match.distance / 64, 3))
+
+        self.pending[item['page_id']] = fp, body.get('keywords')
+        self.links[item['page_id']] = item['link']
+        return body
+
+    def complete(self, bodies: List[dict]) -> List[dict]:
+        """批量提取 bodies 中缺少的关键词并记录到工作日志，返回可以上传的 body；提取失败的 page 下次运行时重试"""
+        todo = [body for body in bodies if 'keywords' not in body]
+        try:
+            keywords = keyword_engine.extract_many([body['text'] for body in todo], 10) if todo else []
+        except Exception as _e:
+            logger.error('Extract keywords error, skip %d pages, %s', len(todo), _e, exc_info=_e)
+            for body in todo:
+                self.pending.pop(body['page_id'], None)
+            bodies, todo, keywords = [body for body in bodies if 'keywords' in body], [], []
+        for body, _keywords in zip(todo, keywords):
+            body['keywords'] = _keywords
+            self.pending[body['page_id']] = self.pending[body['page_id']][0], _keywords
+
+        for body in bodies:
+            link = self.links.pop(body['page_id'], None)
+            if link is not None:  # 从工作日志恢复的 body 已经记录过
+                self.journal.fetched(body['page_id'], link, body)
+                logger.info('Uploading page text: %s', body['page_id'])
+        return bodies
+
+    def finish(self, results: Dict[str, bool]):
+        """记录上传结果并关闭索引"""
+        for page_id, ok in results.items():
+            if ok and page_id in self.pending:
+                self.fp_index.add(page_id, *self.pending[page_id])
+            if ok:
+                self.journal.uploaded(page_id)
+        logger.info('%d failed pages are waiting for retry.', self.journal.skipped())
+        self.fp_index.close()
+        self.journal.close()
+        keyword_engine.save()
+
+
+def load_text(config, client: DSAClient = None):
+    """从controller中获取当前配置中没有text的配置信息，并发抓取正文、提取关键词并上传
+
+    正文指纹与已上传的正文完全相同时复用其关键词并标记 duplicate_of，近似重复的正文在 body 中标记 near_duplicate_of；
+    其它正文每 DSA_KEYWORD_BATCH 篇批量提取一次关键词；指纹在 Controller 确认上传之后才写入索引。
+
+    :param client: 处理该配置的客户端，默认使用 settings.dsa_client
+    """
+    client = client or dsa_client
+    finds = Finds(config, HostLimiter(DSA_HOST_CONCURRENCY, DSA_HOST_RPS))
+    loader = TextLoader(config, client)
+
+    def _load(item: dict):
+        """拥有2个key的dict: page_id, link"""
+        body = loader.resumed(item)
+        if body is not None:
+            return body
+        try:
+            text = finds.get_text(item['link'])
+        except Exception as _e:
+            loader.failed(item, _e)
+            raise
+        return loader.prepare(item, text)
+
+    def _bodies():
+        for item, body, _e in map_unordered(_load, loader.items(client.page_no_text()), workers=DSA_WORKERS):
+            if _e is not None:
+                logger.error('Load text error, link: %s, %s', item['link'], _e, exc_info=_e)
+            elif body is not None:
+                yield body
+
+    def _completed():
+        for batch in batched(threaded(_bodies(), maxsize=DSA_PIPELINE_QUEUE, tick=1.0), DSA_KEYWORD_BATCH, 2.0):
+            yield from loader.complete(batch)
+
+    _start = time.monotonic()
+    results = client.page_update_many(threaded(_completed(), maxsize=DSA_PIPELINE_QUEUE, tick=1.0,
+                                               name='dsa-keywords'))
+    client.Cache.TEXT_SECONDS += time.monotonic() - _start
+    loader.finish(results)
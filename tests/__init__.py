@@ -0,0 +1 @@
+"""单元测试：python -m pytest -q tests"""
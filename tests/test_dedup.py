@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+dedup.HashSet：增删查、扩容、删除标记与持久化
+"""
+import pytest
+
+from dedup import HashSet
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path.joinpath('ids.hset')
+
+
+def test_add_contains_discard(path):
+    s = HashSet(path, capacity=16)
+    s.update(['a', 'b', 'a'])
+    assert 'a' in s and 'b' in s and 'c' not in s
+    assert len(s) == 2
+    s.discard('a')
+    s.discard('missing')
+    assert 'a' not in s and 'b' in s
+    assert len(s) == 1
+
+
+def test_resize_keeps_values(path):
+    s = HashSet(path, capacity=8)
+    values = [f'https://example.com/{i}' for i in range(1000)]
+    s.update(values)
+    assert len(s) == 1000
+    assert s._capacity > 1000
+    assert all(v in s for v in values)
+    assert 'https://example.com/1000' not in s
+
+
+def test_tombstones_are_reused(path):
+    s = HashSet(path, capacity=64)
+    for i in range(200):  # 反复增删，删除标记不能使表被占满
+        s.add(str(i))
+        s.discard(str(i))
+    assert len(s) == 0
+    assert s._count + s._tombstones <= s._capacity * 0.6
+    s.add('x')
+    assert 'x' in s and '199' not in s
+
+
+def test_persistence(path):
+    s = HashSet(path, capacity=8)
+    s.update(str(i) for i in range(50))
+    s.discard('7')
+    s.flush()
+    s._close()
+
+    reopened = HashSet(path)
+    assert len(reopened) == 49
+    assert '0' in reopened and '49' in reopened and '7' not in reopened
+
+
+def test_clear(path):
+    s = HashSet(path, capacity=8)
+    s.update(str(i) for i in range(20))
+    s.clear()
+    assert len(s) == 0 and '1' not in s
+    s.add('1')
+    assert '1' in s
+
+
+def test_rejects_other_files(path):
+    path.write_bytes(b'x' * 64)
+    with pytest.raises(ValueError):
+        HashSet(path)
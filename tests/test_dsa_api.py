@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+dsa_api._iter_json_array：流式响应按任意位置分块时的解析；DSAClient.client_iter 对空数据的处理
+"""
+import json
+import random
+
+import pytest
+import requests
+
+from dsa_api import DSAClient, _iter_json_array
+
+
+class _Response:
+    """只实现 _iter_json_array 用到的 encoding 与 iter_content"""
+
+    encoding = 'utf-8'
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+
+def _split(raw: bytes, cuts) -> list:
+    cuts = sorted(set(cuts))
+    return [raw[a:b] for a, b in zip([0, *cuts], [*cuts, len(raw)])]
+
+
+@pytest.mark.parametrize('chunks, expected', [
+    ([b'{"data": [1e', b'5, 2]}'], [1e5, 2]),
+    ([b'{"data": [1', b'.5e-', b'3]}'], [1.5e-3]),
+    ([b'{"data": [-', b'7, 12', b'3]}'], [-7, 123]),
+    ([b'{"data": [tr', b'ue, nu', b'll]}'], [True, None]),
+    ([b'{"status": 200, "da', b'ta": []}'], []),
+    ([b'  [1, ', b'"a"]'], [1, 'a']),
+    ([b'{"status": 200, "data": nu', b'll, "message": "[1]"}'], []),
+])
+def test_split_tokens(chunks, expected):
+    assert list(_iter_json_array(_Response(chunks))) == expected
+
+
+def test_multibyte_split():
+    raw = json.dumps({'data': ['中文标题']}, ensure_ascii=False).encode()
+    assert list(_iter_json_array(_Response(_split(raw, range(1, len(raw)))))) == ['中文标题']
+
+
+def test_key_is_not_matched_inside_strings():
+    raw = b'{"message": "\\"data\\": [9]", "data": [1]}'
+    assert list(_iter_json_array(_Response([raw]))) == [1]
+
+
+def test_missing_array():
+    with pytest.raises(ValueError):
+        list(_iter_json_array(_Response([b'{"status": 406}'])))
+
+
+def test_truncated_response():
+    with pytest.raises(ValueError):
+        list(_iter_json_array(_Response([b'{"data": [1, {"a": ', b'2'])))
+
+
+def test_random_chunks():
+    rand = random.Random(42)
+    values = [1e5, -2.5e-3, 12345678901234, 0, -7, 3.25, True, False, None, 'a"b\\', '中文', {'k': [1, 2e10]}, [], '']
+    for _ in range(500):
+        data = [rand.choice(values) for _ in range(rand.randint(0, 20))]
+        raw = json.dumps(rand.choice([{'status': 200, 'data': data}, data]),
+                         ensure_ascii=rand.random() < 0.5, indent=rand.choice([None, 1])).encode()
+        chunks = _split(raw, rand.sample(range(1, len(raw)), min(len(raw) - 1, rand.randint(0, 12))))
+        assert list(_iter_json_array(_Response(chunks))) == data
+
+
+def _client(monkeypatch, tmp_path, status_code, body: bytes, content_type='application/json'):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp.headers['Content-Type'] = content_type
+    resp._content, resp._content_consumed = body, True
+    client = DSAClient('http://controller', cache_dir=tmp_path)
+    monkeypatch.setattr(client, 'get', lambda *args, **kwargs: resp)
+    return client
+
+
+@pytest.mark.parametrize('status_code, body, content_type', [
+    (200, b'{"status": 200, "data": null}', 'application/json'),
+    (200, b'{"status": 200, "data": null}', 'text/plain'),
+    (406, b'{"status": 406, "message": "no data"}', 'application/json'),
+])
+def test_client_iter_empty(monkeypatch, tmp_path, status_code, body, content_type):
+    assert list(_client(monkeypatch, tmp_path, status_code, body, content_type).client_iter('/apis/pages')) == []
+
+
+@pytest.mark.parametrize('status_code, body', [(406, b'Not Acceptable'), (500, b'{"status": 500}')])
+def test_client_iter_error(monkeypatch, tmp_path, status_code, body):
+    with pytest.raises(requests.RequestException):
+        list(_client(monkeypatch, tmp_path, status_code, body).client_iter('/apis/pages'))
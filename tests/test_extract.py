@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+extract.extract_text：样板内容的识别与按密度、按选择器提取
+"""
+import html_static
+from extract import TextExtractor, extract_text, strip_boilerplate
+
+PARAGRAPH = '<p>个人信息保护监管机构发布通知，平台应当公开透明地说明处理程序，并在规定期限内完成登记与合规评估。</p>'
+ARTICLE = PARAGRAPH * 5
+SENTENCE = '个人信息保护监管机构发布通知'
+
+
+def _doc(body: str, body_attrs=''):
+    return html_static.parse_html(f'<html><head><title>t</title></head><body {body_attrs}>{body}</body></html>',
+                                  'https://example.com/')
+
+
+def test_wordpress_body_class():
+    doc = _doc(f'<div id="page" class="site"><header class="site-header"><nav class="main-navigation">'
+               f'<a href="/">Home</a></nav></header><div id="content" class="site-content has-sidebar">'
+               f'<article class="post">{ARTICLE}</article></div><div class="widget-area sidebar">Recent posts</div>'
+               f'<footer class="site-footer">Copyright</footer></div>',
+               'class="home blog hfeed no-sidebar"')
+    text = extract_text(doc)
+    assert SENTENCE in text
+    assert 'Recent posts' not in text and 'Copyright' not in text and 'Home' not in text
+
+
+def test_aspnet_form_is_kept():
+    doc = _doc(f'<form id="aspnetForm" method="post"><div class="nav"><a href="/">Home</a></div>'
+               f'<div id="content">{ARTICLE}</div><div class="share">Share this</div></form>')
+    text = extract_text(doc)
+    assert SENTENCE in text
+    assert 'Share this' not in text
+
+
+def test_whole_tokens_only():
+    doc = _doc(f'<div class="content-menu-free">{ARTICLE}</div><div class="menu">Menu</div>')
+    strip_boilerplate(doc)
+    assert SENTENCE in doc.text_content() and 'Menu' not in doc.text_content()
+
+
+def test_element_with_most_text_is_kept():
+    doc = _doc(f'<div class="related">{ARTICLE}</div><p>short</p>')
+    assert SENTENCE in extract_text(doc)
+
+
+def test_scripts_are_removed():
+    doc = _doc(f'<div>{ARTICLE}</div><script>var data = "{"x, " * 2000}";</script>')
+    text = extract_text(doc)
+    assert SENTENCE in text and 'var data' not in text
+
+
+def test_selected_elements_are_not_stripped():
+    doc = _doc(f'<div class="article"><header><h1>Title</h1></header>{PARAGRAPH}'
+               f'<aside>Note</aside><div class="related">Related</div></div>')
+    text = extract_text(doc, ['div.article'])
+    assert text.splitlines()[0] == 'Title'
+    assert 'Note' in text and 'Related' in text
+
+
+def test_selector_without_match():
+    assert extract_text(_doc(ARTICLE), ['div.missing']) == ''
+
+
+def test_str_with_xml_declaration(tmp_path):
+    markup = f'<?xml version="1.0" encoding="utf-8"?>\n<html><body><div>{ARTICLE}</div></body></html>'
+    assert SENTENCE in extract_text(html_static.parse_html(markup, 'https://example.com/'))
+    extractor = TextExtractor(tmp_path)
+    assert SENTENCE in extractor.extract('https://example.com/a', markup)
+    assert SENTENCE in extractor.reextract('https://example.com/a', ['div'])
+    extractor.close()
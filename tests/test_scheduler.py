@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+scheduler.UpdateSchedule：按更新频率计算间隔、到期判断与持久化
+"""
+import pytest
+
+from scheduler import UpdateSchedule
+
+HOUR = 3600
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+def schedule(tmp_path):
+    return UpdateSchedule(tmp_path.joinpath('schedule.json'), target=3, min_hours=1, max_hours=168, alpha=0.5,
+                          slack=0.1)
+
+
+def test_unknown_config_is_due(schedule):
+    assert schedule.due(1, now=T0)
+    assert schedule.next_due(1) is None
+
+
+def test_first_run_is_not_rated(schedule):
+    """第一次运行的新页面包含历史积压"""
+    assert schedule.record(1, 500, now=T0) == T0 + 1 * HOUR
+    assert schedule._entries['1']['rate'] is None
+
+
+def test_interval_follows_rate(schedule):
+    schedule.record(1, 0, now=T0)
+    schedule.record(1, 6, now=T0 + 2 * HOUR)  # 3 页/小时 -> 1 小时
+    assert schedule._entries['1']['interval'] == pytest.approx(1)
+    schedule.record(1, 0, now=T0 + 3 * HOUR)  # EMA: 0.5 * 0 + 0.5 * 3 = 1.5 页/小时 -> 2 小时
+    assert schedule._entries['1']['rate'] == pytest.approx(1.5)
+    assert schedule.next_due(1) == pytest.approx(T0 + 5 * HOUR)
+
+
+def test_no_new_pages_doubles_up_to_max(schedule):
+    now = T0
+    schedule.record(1, 0, now=now)
+    intervals = []
+    for _ in range(10):
+        now = schedule.next_due(1)
+        schedule.record(1, 0, now=now)
+        intervals.append(schedule._entries['1']['interval'])
+    assert intervals[:4] == [2, 4, 8, 16]
+    assert intervals[-1] == 168
+
+
+def test_interval_is_clamped(schedule):
+    schedule.record(1, 0, now=T0)
+    schedule.record(1, 1000, now=T0 + HOUR)
+    assert schedule._entries['1']['interval'] == 1
+
+
+def test_due_with_slack(schedule):
+    schedule.record(1, 0, now=T0)
+    schedule.record(1, 1, now=T0 + 10 * HOUR)  # 0.1 页/小时 -> 30 小时，slack 3 小时
+    due = schedule.next_due(1)
+    assert not schedule.due(1, now=due - 3.5 * HOUR)
+    assert schedule.due(1, now=due - 2.5 * HOUR)
+    assert schedule.due('1', now=due)
+
+
+def test_persistence(schedule, tmp_path):
+    schedule.record(7, 0, now=T0)
+    reopened = UpdateSchedule(tmp_path.joinpath('schedule.json'))
+    assert reopened.next_due(7) == schedule.next_due(7)
+    assert not reopened.due(7, now=T0)
+
+
+def test_corrupt_state_is_ignored(tmp_path):
+    path = tmp_path.joinpath('schedule.json')
+    path.write_text('{not json', encoding='utf8')
+    assert UpdateSchedule(path).due(1, now=T0)
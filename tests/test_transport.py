@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+transport.CircuitBreaker：打开、半开探测与恢复；backoff 与 retry_after
+"""
+import pytest
+import requests
+
+import transport
+from transport import CircuitBreaker, CircuitOpenError, backoff, retry_after
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(transport.time, 'monotonic', clock)
+    return clock
+
+
+def _fail(breaker, times):
+    for _ in range(times):
+        breaker.allow()
+        breaker.record(False)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failures=3, reset_after=30)
+    _fail(breaker, 2)
+    breaker.record(True)  # 成功后重新计数
+    _fail(breaker, 2)
+    assert breaker.state == 'closed'
+    _fail(breaker, 1)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_open_error_is_a_connection_error():
+    assert issubclass(CircuitOpenError, requests.ConnectionError)
+
+
+def test_half_open_allows_one_probe(clock):
+    breaker = CircuitBreaker(failures=1, reset_after=30)
+    _fail(breaker, 1)
+    clock.now += 30
+    assert breaker.state == 'half-open'
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):  # 探测请求进行中
+        breaker.allow()
+    breaker.record(True)
+    assert breaker.state == 'closed'
+    breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failures=1, reset_after=30)
+    _fail(breaker, 1)
+    clock.now += 30
+    breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open'
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    clock.now += 1
+    breaker.allow()
+
+
+def test_unrecorded_probe_expires(clock):
+    breaker = CircuitBreaker(failures=1, reset_after=30)
+    _fail(breaker, 1)
+    clock.now += 30
+    breaker.allow()  # 探测请求抛出了其它异常，没有记录结果
+    clock.now += 30
+    breaker.allow()
+
+
+def test_backoff_is_capped():
+    assert all(0 <= backoff(attempt, base=0.5, cap=4) <= min(4, 0.5 * 2 ** attempt) for attempt in range(10))
+
+
+@pytest.mark.parametrize('value, expected', [(None, None), ('5', 5.0), ('-3', 0.0), ('600', 120.0), ('soon', None)])
+def test_retry_after(value, expected):
+    resp = requests.Response()
+    if value is not None:
+        resp.headers['Retry-After'] = value
+    assert retry_after(resp) == expected
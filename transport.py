@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Controller 请求的传输层：固定大小的长连接池、超时、带抖动的指数退避(遵守 Retry-After)与熔断器。
+
+Controller 持续不可用时熔断器打开，请求立即失败而不是逐个等待超时；
+经过 reset_after 秒后放行一个探测请求，成功则恢复。
+"""
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__all__ = ['CircuitBreaker', 'CircuitOpenError', 'backoff', 'retry_after', 'pooled_adapter',
+           'IDEMPOTENT_METHODS', 'RETRY_STATUS']
+
+logger = logging.getLogger('dsa.spider.transport')
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+# 可重试的状态码；非幂等的请求只在服务端明确拒绝(429、503)时重试
+RETRY_STATUS = {'idempotent': frozenset([429, 500, 502, 503, 504]), 'other': frozenset([429, 503])}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """熔断器打开时拒绝请求"""
+
+
+class CircuitBreaker:
+    """连续 failures 次失败后打开，reset_after 秒后半开，放行一个探测请求
+
+    :param failures: 打开熔断器的连续失败次数
+    :param reset_after: 打开后多少秒允许探测
+    """
+
+    def __init__(self, failures=5, reset_after=30.0):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._count = 0
+        self._opened_at = None
+        self._probing = None  # 探测请求的开始时间
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self._opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        """请求前调用，熔断器打开时抛出 CircuitOpenError"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            # 探测请求没有记录结果(例如抛出了其它异常)时，reset_after 秒后允许下一个探测
+            if state == 'half-open' and (self._probing is None or time.monotonic() - self._probing >= self.reset_after):
+                self._probing = time.monotonic()
+                return
+        raise CircuitOpenError(f'Circuit is {state}, controller requests are rejected.')
+
+    def record(self, success: bool):
+        with self._lock:
+            self._probing = None
+            if success:
+                if self._opened_at is not None:
+                    logger.info('Circuit closed.')
+                self._count, self._opened_at = 0, None
+                return
+            self._count += 1
+            if self._count >= self.failures:
+                if self._opened_at is None:
+                    logger.warning('Circuit opened after %d failures, retry in %.0fs.', self._count, self.reset_after)
+                self._opened_at = time.monotonic()
+
+
+def backoff(attempt, base=0.5, cap=30.0) -> float:
+    """第 attempt 次(从 0 开始)重试前的等待秒数，full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after(resp: requests.Response, cap=120.0):
+    """解析 Retry-After 头(秒数或 HTTP 日期)，没有或无法解析时返回 None"""
+    value = resp.headers.get('Retry-After') if resp is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), cap)
+
+
+def pooled_adapter(pool_size=16) -> HTTPAdapter:
+    """保持至多 pool_size 个长连接；重试由 DSAClient 处理，urllib3 不重试"""
+    return HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)